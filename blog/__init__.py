@@ -1,14 +1,59 @@
+import os
 import json
-from redis import StrictRedis
-from .services import get_qualified_key_mapping
+import asyncio
+from typing import Union
+from weakref import WeakKeyDictionary
+from .metrics import BlockingAsyncRedis, InstrumentedRedis, InstrumentedAsyncRedis
 
-with open('blog_backend/env.json') as env:
+# 可以用环境变量BLOG_ENV_FILE指定其他配置，e.g. 压测使用的blog_backend/env.bench.json
+with open(os.environ.get('BLOG_ENV_FILE', 'blog_backend/env.json')) as env:
     env_dict: dict = json.load(env)
-    config: dict = env_dict['REDIS_INFO']
+    config: dict = dict(env_dict['REDIS_INFO'], decode_responses=True)
 
-redis = StrictRedis(**config, decode_responses=True, health_check_interval=120)
+redis_class: type = InstrumentedRedis
+async_redis_class: type = InstrumentedAsyncRedis
+if config.pop('fake', False):
+    # 本地压测时用进程内的fakeredis代替redis，需要 pip install fakeredis[lua]
+    import fakeredis
 
-with open('blog/Authority.json', 'rb') as authority_file:
-    authority_config: list[dict] = json.load(authority_file)
+    class FakeInstrumentedRedis(InstrumentedRedis, fakeredis.FakeStrictRedis):
+        pass
 
-qualified_key_mapping: dict = get_qualified_key_mapping(authority_config)
+    class FakeInstrumentedAsyncRedis(InstrumentedAsyncRedis, fakeredis.FakeAsyncRedis):
+        pass
+
+    redis_class, async_redis_class = FakeInstrumentedRedis, FakeInstrumentedAsyncRedis
+    # 同步和异步客户端共用一份数据
+    config = {'server': fakeredis.FakeServer(), 'decode_responses': True}
+else:
+    config['health_check_interval'] = 120
+    # redis变慢时命令超时失败，由熔断器和各处的降级逻辑处理，不让前台请求一直挂起；可在REDIS_INFO中覆盖
+    config.setdefault('socket_connect_timeout', 0.5)
+    config.setdefault('socket_timeout', 1)
+
+redis = redis_class(**config)
+# 以ASGI运行时由blog_backend/asgi.py设置
+ASGI: bool = os.environ.get('BLOG_ASGI') == '1'
+# WSGI下异步view每个请求新建一个事件循环，异步客户端的连接和事件循环绑定，不能复用，
+# 所以改用同步客户端，只有一个连接池；ASGI下只有一个事件循环，也就只有一个异步客户端
+_blocking_async_redis = BlockingAsyncRedis(redis)
+_async_redis_clients: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_async_redis() -> Union[InstrumentedAsyncRedis, BlockingAsyncRedis]:
+    """获取当前事件循环的异步redis客户端，只能在协程中调用"""
+    if not ASGI:
+        return _blocking_async_redis
+    loop = asyncio.get_running_loop()
+    client = _async_redis_clients.get(loop)
+    if client is None:
+        client = async_redis_class(**config)
+        _async_redis_clients[loop] = client
+    return client
+
+
+async def close_async_redis() -> None:
+    """关闭当前事件循环的异步redis客户端，事件循环结束前调用"""
+    client = _async_redis_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
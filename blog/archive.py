@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from redis import RedisError, WatchError
+from django.db.models import Count
+
+from blog import redis
+from blog.breaker import redis_breaker
+from blog.models import Article, ArticleTag
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Optional
+    from django.db.models import QuerySet
+
+
+class ArchiveStore:
+    """文章归档统计，按分类、标签、月份存放在redis hash里
+
+    分类 category_id => count，未分类id为0
+    标签 tag_id => count
+    月份 'YYYY-MM' => count
+    文章增删改时按差值更新，读取时只和桶的数量相关，和文章数量无关。
+    READY标记不存在时（首次部署、redis被清空、更新失败）读取会触发全量重建，
+    也可以用 rebuild_archive 命令手动修复。
+    """
+    keys: dict[str, str] = {
+        'category': RedisKey.BLOG_ARCHIVE_CATEGORY,
+        'tag': RedisKey.BLOG_ARCHIVE_TAG,
+        'month': RedisKey.BLOG_ARCHIVE_MONTH,
+    }
+
+    def get_counts(self, cate: str) -> dict[str, int]:
+        """获取某类归档的统计，cate => category | tag | month"""
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.exists(RedisKey.BLOG_ARCHIVE_READY)
+            pipe.hgetall(self.keys[cate])
+            ready, counts = pipe.execute()
+            if not ready:
+                counts = self.rebuild()[cate]
+        except RedisError:
+            # redis不可用或者重建一直冲突时从db统计，前台的响应缓存会在进程内缓存结果
+            counts = self.count_from_db()[cate]
+        return {bucket: int(count) for bucket, count in counts.items() if int(count) > 0}
+
+    def count_querysets(self) -> dict[str, QuerySet[dict]]:
+        """重建时的分组统计查询，都按索引列分组，explain_queries命令会检查执行计划"""
+        return {
+            'category': Article.objects.values('category').annotate(count=Count('*')),
+            'tag': ArticleTag.objects.values('tag').annotate(count=Count('*')),
+            # 按年月字段分组，不用TruncMonth，否则要对每行计算函数，用不上索引
+            'month': Article.objects.values('year_month').annotate(count=Count('*')),
+        }
+
+    def count_from_db(self) -> dict[str, dict[str, int]]:
+        querysets: dict[str, QuerySet[dict]] = self.count_querysets()
+        return {
+            'category': {str(record['category'] or 0): record['count'] for record in querysets['category']},
+            'tag': {str(record['tag']): record['count'] for record in querysets['tag']},
+            'month': {record['year_month']: record['count'] for record in querysets['month']},
+        }
+
+    def rebuild(self, attempts: int = 3) -> dict[str, dict[str, int]]:
+        """从db全量重新统计，写入redis并返回统计结果
+
+        查库前WATCH统计和READY标记，查库期间有文章增删改按差值更新了统计的话，事务放弃写入并重新统计，
+        不会用查库前的结果覆盖掉这次更新。attempts次都冲突时抛出WatchError，READY保持不存在，下次读取再重建。
+        """
+        watched_keys: list[str] = [*self.keys.values(), RedisKey.BLOG_ARCHIVE_READY]
+        for _ in range(attempts):
+            with redis.pipeline(transaction=True) as pipe:
+                pipe.watch(*watched_keys)
+                archive = self.count_from_db()
+                # 事务里先删后写，读取方不会看到写了一半的统计
+                pipe.multi()
+                for cate, key in self.keys.items():
+                    pipe.delete(key)
+                    if archive[cate]:
+                        pipe.hset(key, mapping=archive[cate])
+                pipe.set(RedisKey.BLOG_ARCHIVE_READY, 1)
+                try:
+                    pipe.execute()
+                except WatchError:
+                    continue
+            return archive
+        raise WatchError('重建归档统计时连续{0}次冲突'.format(attempts))
+
+    def add_article(self, article: Article) -> None:
+        self.apply(article.category_id, article.tags, article.year_month, 1)
+
+    def remove_article(self, article: Article) -> None:
+        self.apply(article.category_id, article.tags, article.year_month, -1)
+
+    def update_article(self, old_category_id: Optional[int], old_tags: list[int], article: Article) -> None:
+        """修改文章时，先减掉旧的分类和标签，再加上新的，创建时间不会变，不需要处理月份"""
+        self.apply(old_category_id, old_tags, None, -1)
+        self.apply(article.category_id, article.tags, None, 1)
+
+    def move_category(self, category_id: int) -> None:
+        """删除分类后，文章变为未分类，把统计移到未分类下"""
+        key: str = RedisKey.BLOG_ARCHIVE_CATEGORY
+        try:
+            count: Optional[str] = redis.hget(key, category_id)
+            if count:
+                pipe = redis.pipeline(transaction=True)
+                pipe.hincrby(key, 0, int(count))
+                pipe.hdel(key, category_id)
+                pipe.execute()
+        except RedisError:
+            self.invalidate()
+
+    def apply(self, category_id: Optional[int], tags: list[int], month: Optional[str], delta: int) -> None:
+        """按差值更新统计，更新失败时标记失效，下次读取时重建"""
+        buckets: list[tuple[str, str]] = [(RedisKey.BLOG_ARCHIVE_CATEGORY, str(category_id or 0))]
+        buckets.extend((RedisKey.BLOG_ARCHIVE_TAG, str(tag_id)) for tag_id in tags)
+        if month is not None:
+            buckets.append((RedisKey.BLOG_ARCHIVE_MONTH, month))
+        try:
+            pipe = redis.pipeline(transaction=True)
+            for key, bucket in buckets:
+                pipe.hincrby(key, bucket, delta)
+            counts: list[int] = pipe.execute()
+            # 清理计数归零的桶
+            empty_buckets: list[tuple[str, str]] = [
+                buckets[index] for index, count in enumerate(counts) if count <= 0
+            ]
+            if empty_buckets:
+                pipe = redis.pipeline(transaction=False)
+                for key, bucket in empty_buckets:
+                    pipe.hdel(key, bucket)
+                pipe.execute()
+        except RedisError:
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        try:
+            redis.delete(RedisKey.BLOG_ARCHIVE_READY)
+        except RedisError:
+            # redis恢复后再标记，否则恢复后会一直用不可用期间没有更新的统计
+            redis_breaker.defer('archive_store.invalidate', self.invalidate)
+
+
+archive_store = ArchiveStore()
@@ -4,6 +4,7 @@ from blog.views.blog.category_view import CategoryView, CategoriesView
 from blog.views.blog.mood_view import MoodView, MoodsView
 from blog.views.system.group_view import GroupView, GroupsView, GroupMembersView, GroupPermissionView
 from blog.views.system.menu_view import MenuView
+from blog.views.system.metrics_view import MetricsView
 from blog.views.system.permission_view import PermissionTreeView
 from blog.views.system.token_view import TokenView
 from blog.views.system.user_view import UserView, UsersView, UserSearchListView, UserValidityView
@@ -25,6 +26,8 @@ urlpatterns = [
     # 菜单和权限
     path('system/menu', MenuView.as_view()),
     path('system/permission/tree', PermissionTreeView.as_view()),
+    # 性能数据
+    path('system/metrics', MetricsView.as_view()),
 
     # 文章和分类
     path('blog/article', ArticleView.as_view()),
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+from redis.exceptions import ConnectionError, TimeoutError
+
+if TYPE_CHECKING:
+    from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger('blog')
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断期间不访问redis，直接抛出，调用方按redis不可用处理"""
+
+
+class CircuitBreaker:
+    """redis熔断器，同步和异步客户端共用
+
+    连续failure_threshold次连接失败或超时后熔断reset_timeout秒，期间所有命令直接抛出CircuitOpenError，
+    不用每个请求都等到超时；熔断结束后只放行一个探测命令，成功则恢复，失败则继续熔断。
+    redis不可用时没能执行的失效操作（递增版本号、删除READY标记等）用defer登记，
+    redis恢复后第一次成功执行命令时补做，避免恢复后继续返回旧数据；
+    有待补做的操作时后台线程每隔replay_interval秒也尝试补做一次，没有请求访问redis时恢复后也能补上。
+    """
+    # 连续失败多少次后熔断
+    failure_threshold: int = 3
+    # 熔断时间，单位秒
+    reset_timeout: float = 5
+    # 后台补做的间隔，单位秒
+    replay_interval: float = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures: int = 0
+        # 熔断开始时间，0表示没有熔断
+        self._opened_at: float = 0
+        # name => 恢复后补做的操作，同名操作只保留一个
+        self._deferred: dict[str, Callable[[], Any]] = {}
+        self._replaying: bool = False
+        # 后台补做线程所在的进程id，fork出的子进程没有这个线程，需要重新启动
+        self._replayer_pid: int = 0
+
+    def before_call(self) -> None:
+        """执行命令前调用，熔断中抛出CircuitOpenError"""
+        if not self._opened_at:
+            return
+        with self._lock:
+            now: float = time.monotonic()
+            if self._opened_at and now - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError('redis熔断中')
+            # 熔断时间已过，放行当前命令作为探测，其他命令继续等待下一个熔断周期
+            if self._opened_at:
+                self._opened_at = now
+
+    def record_success(self, replay: bool = True) -> None:
+        if self._failures or self._opened_at:
+            with self._lock:
+                if self._opened_at:
+                    logger.warning('redis已恢复')
+                self._failures, self._opened_at = 0, 0
+        if replay and self._deferred:
+            self.replay()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and not self._opened_at:
+                self._opened_at = time.monotonic()
+                logger.warning('redis连续%s次连接失败或超时，熔断%s秒', self._failures, self.reset_timeout)
+            elif self._opened_at:
+                # 探测失败，重新开始熔断计时
+                self._opened_at = time.monotonic()
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        self.before_call()
+        try:
+            result: Any = func(*args, **kwargs)
+        except (ConnectionError, TimeoutError):
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """同call，补做的操作使用同步客户端，放到线程中执行"""
+        self.before_call()
+        try:
+            result: Any = await func(*args, **kwargs)
+        except (ConnectionError, TimeoutError):
+            self.record_failure()
+            raise
+        self.record_success(replay=False)
+        if self._deferred and not self._replaying:
+            asyncio.get_running_loop().run_in_executor(None, self.replay)
+        return result
+
+    def defer(self, name: str, func: Callable[[], Any]) -> None:
+        """登记redis恢复后补做的操作，func失败时抛出RedisError，会在下次恢复时重试"""
+        with self._lock:
+            self._deferred[name] = func
+            if self._replayer_pid == os.getpid():
+                return
+            self._replayer_pid = os.getpid()
+        threading.Thread(target=self.replay_forever, name='redis-breaker-replayer', daemon=True).start()
+
+    def is_deferred(self, name: str) -> bool:
+        """name对应的操作是否还在等待补做"""
+        return name in self._deferred
+
+    def replay_forever(self) -> None:
+        """定期补做，全部补做完后退出，之后再有defer时重新启动"""
+        while True:
+            time.sleep(self.replay_interval)
+            # 熔断中补做也会直接失败，等到可以探测时再试
+            if not self._opened_at or time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.replay()
+            with self._lock:
+                if not self._deferred:
+                    self._replayer_pid = 0
+                    return
+
+    def replay(self) -> None:
+        with self._lock:
+            if self._replaying or not self._deferred:
+                return
+            self._replaying = True
+            deferred: dict[str, Callable[[], Any]] = self._deferred
+            self._deferred = {}
+        try:
+            for name, func in deferred.items():
+                try:
+                    func()
+                except Exception:
+                    # 再次失败的操作放回去，名字相同的新登记优先
+                    logger.warning('redis恢复后补做%s失败', name, exc_info=True)
+                    with self._lock:
+                        self._deferred.setdefault(name, func)
+        finally:
+            self._replaying = False
+
+
+redis_breaker = CircuitBreaker()
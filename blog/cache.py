@@ -0,0 +1,687 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from functools import partial
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
+
+from redis import RedisError
+
+from blog import redis, get_async_redis
+from blog.breaker import redis_breaker
+from blog.models import User, Permission, Tag
+from blog.serializers import json_serializer
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Any, Awaitable, Callable, Hashable, Iterable, Iterator, Optional
+    from django.http import HttpRequest
+    from django.db.models import QuerySet
+
+
+class LRUCache:
+    """进程内LRU缓存，带过期时间，线程安全"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60):
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        # key => (过期时间戳, value)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item: Optional[tuple[float, Any]] = self._data.get(key)
+            if item is None:
+                return None
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expire_at: float = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            # 超出容量时淘汰最久未使用的
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, predicate: Callable[[Any], bool]) -> None:
+        """删除value满足predicate的全部缓存，需要遍历，只用于低频操作"""
+        with self._lock:
+            keys: list[Hashable] = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SingleFlight:
+    """进程内请求合并，同一个key同时只执行一次计算，其他线程或协程等待并共享结果"""
+    # 协程等待结果时的轮询间隔，单位秒
+    poll_interval: float = 0.005
+
+    class Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+        def get(self) -> Any:
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+    def __init__(self):
+        self._calls: dict[Hashable, SingleFlight.Call] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> tuple[SingleFlight.Call, bool]:
+        """返回key对应的计算，以及当前调用方是否负责执行"""
+        with self._lock:
+            call: Optional[SingleFlight.Call] = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = self.Call()
+            return call, True
+
+    def _done(self, key: Hashable, call: SingleFlight.Call) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        call.event.set()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        call, leader = self._join(key)
+        if not leader:
+            call.event.wait()
+            return call.get()
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._done(key, call)
+        return call.result
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """do的异步版本，WSGI下每个异步请求一个事件循环，用轮询等待，不依赖事件循环"""
+        call, leader = self._join(key)
+        if not leader:
+            while not call.event.is_set():
+                await asyncio.sleep(self.poll_interval)
+            return call.get()
+        try:
+            call.result = await func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._done(key, call)
+        return call.result
+
+
+class ResponseCache:
+    """前台接口响应缓存
+
+    缓存按 path + 决定响应内容的查询参数 存放序列化好的data，value格式为 '{version}:{fresh_until}:{json}'，
+    参数按名字排序，view没有声明的参数不参与，随意添加参数不会产生新的缓存；
+    版本号只在value里，重建时覆盖同一个key，旧版本的缓存不会堆积。
+    读取时用mget同时取出全局版本号和缓存，一次往返就能判断缓存是否有效。
+    后台写操作调用bump()递增版本号，旧缓存自然失效，等待过期即可，不需要逐个删除。
+    fresh_until为0时缓存只随版本号失效，否则到时间后也失效，由view的cache_ttl指定。
+
+    缓存失效后防止击穿：
+    同一进程内相同key的并发请求先用SingleFlight合并；进程之间用redis锁，只有拿到锁的进程查库重建，
+    其他进程直接返回失效前的旧缓存，没有旧缓存时等待重建结果，等待超时再自己查库。
+    redis不可用时改用进程内缓存，local_ttl秒内相同请求只查一次库，没能递增的版本号在redis恢复后补上。
+    """
+    # 缓存过期时间，单位秒，设置了cache_ttl的接口为cache_ttl + stale_ttl
+    timeout: int = 60 * 60
+    # 按时间失效的缓存，失效后还可以作为旧缓存返回的时间，单位秒
+    stale_ttl: int = 60
+    # 重建锁的过期时间，持锁进程异常退出时最多阻塞其他进程这么久，单位秒
+    lock_timeout: float = 10
+    # 没有旧缓存时等待其他进程重建的最长时间，单位秒
+    wait_timeout: float = 2
+    # 等待重建时的轮询间隔，单位秒
+    poll_interval: float = 0.02
+    # redis不可用时进程内缓存的有效时间，单位秒，其他进程的写操作最多这么久之后可见
+    local_ttl: float = 5
+
+    def __init__(self):
+        self.single_flight = SingleFlight()
+        # redis不可用时使用的进程内缓存
+        self.local = LRUCache(maxsize=512, ttl=self.local_ttl)
+
+    def make_key(self, request: HttpRequest, params: Optional[Iterable[str]] = None) -> str:
+        """params为决定响应内容的参数名，None时使用全部参数"""
+        names: list[str] = sorted(request.GET if params is None else params)
+        query_string: str = urlencode([(name, request.GET[name]) for name in names if name in request.GET])
+        digest: str = hashlib.md5('{0}?{1}'.format(request.path, query_string).encode(encoding='utf-8')).hexdigest()
+        return RedisKey.BLOG_CACHE_RESPONSE.format(digest)
+
+    def is_cacheable(self, request: HttpRequest) -> bool:
+        # 只缓存前台GET请求，后台接口需要实时数据
+        return request.method == 'GET' and 'front' in request.path
+
+    def parse(self, value: Optional[str], version: str) -> tuple[Optional[str], bool]:
+        """解析缓存，返回 (json, 是否有效)，没有缓存时json为None"""
+        if value is None:
+            return None, False
+        cached_version, _, rest = value.partition(':')
+        fresh_until, _, data_json = rest.partition(':')
+        if not fresh_until.isdigit():
+            # 无法识别的旧格式，当作没有缓存
+            return None, False
+        fresh: bool = cached_version == version and (fresh_until == '0' or time.time() < int(fresh_until))
+        return data_json, fresh
+
+    def pack(self, version: str, data_json: str, ttl: Optional[int]) -> tuple[str, int]:
+        """生成缓存value和redis过期时间"""
+        if ttl is None:
+            return '{0}:0:{1}'.format(version, data_json), self.timeout
+        return '{0}:{1}:{2}'.format(version, int(time.time()) + ttl, data_json), ttl + self.stale_ttl
+
+    def get_or_set(
+            self, request: HttpRequest, build: Callable[[], Any], ttl: Optional[int] = None,
+            params: Optional[Iterable[str]] = None
+    ) -> str:
+        """命中直接返回缓存的json字符串，未命中调用build生成data，序列化后写入缓存
+
+        Args:
+            request: 当前请求
+            build: 生成响应data的函数，只在未命中时执行
+            ttl: 缓存的有效时间，单位秒，None时只随版本号失效
+            params: 决定响应内容的查询参数名，由view的cache_params指定
+        """
+        if not self.is_cacheable(request):
+            return self.dumps(build())
+
+        key: str = self.make_key(request, params)
+        try:
+            version, value = redis.mget(RedisKey.BLOG_CACHE_VERSION, key)
+        except RedisError:
+            # 缓存不可用时改用进程内缓存，同一进程内的并发请求只查一次
+            data_json: Optional[str] = self.local.get(key)
+            if data_json is None:
+                # 和rebuild的返回值不同，用不同的key合并
+                data_json = self.single_flight.do(('local', key), lambda: self.dumps(build()))
+                self.local.set(key, data_json)
+            return data_json
+        version = version or '0'
+        data_json, fresh = self.parse(value, version)
+        if fresh:
+            return data_json
+        data_json, fresh = self.single_flight.do(key, lambda: self.rebuild(key, version, build, ttl, data_json))
+        if not fresh:
+            self.mark_stale(request)
+        return data_json
+
+    def mark_stale(self, request: HttpRequest) -> None:
+        """返回的是旧版本的缓存，view不能给响应加上按当前版本号生成的ETag，否则客户端之后会一直拿到304"""
+        request.stale_response = True
+
+    def rebuild(
+            self, key: str, version: str, build: Callable[[], Any], ttl: Optional[int], stale: Optional[str]
+    ) -> tuple[str, bool]:
+        """拿到重建锁的进程查库并写入缓存，没拿到锁时返回旧缓存或等待重建结果，返回 (json, 是否当前版本)"""
+        try:
+            lock = redis.lock(RedisKey.BLOG_CACHE_LOCK.format(key), timeout=self.lock_timeout)
+            locked: bool = lock.acquire(blocking=False)
+        except RedisError:
+            lock, locked = None, False
+        if lock is not None and not locked:
+            if stale is not None:
+                return stale, False
+            data_json: Optional[str] = self.wait(key, version)
+            if data_json is not None:
+                return data_json, True
+        try:
+            # 写入时使用查库前读到的版本号，查库期间有写操作的话，这份缓存会直接失效
+            data_json: str = self.dumps(build())
+            value, timeout = self.pack(version, data_json, ttl)
+            try:
+                redis.set(key, value, ex=timeout)
+            except RedisError:
+                pass
+            return data_json, True
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except RedisError:
+                    pass
+
+    def wait(self, key: str, version: str) -> Optional[str]:
+        """等待其他进程写入当前版本的缓存，超时返回None"""
+        deadline: float = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            try:
+                data_json, fresh = self.parse(redis.get(key), version)
+            except RedisError:
+                return None
+            if fresh:
+                return data_json
+        return None
+
+    async def aget_or_set(
+            self, request: HttpRequest, build: Callable[[], Awaitable[Any]], ttl: Optional[int] = None,
+            params: Optional[Iterable[str]] = None
+    ) -> str:
+        """get_or_set的异步版本，使用异步redis客户端，build为返回awaitable的函数"""
+        if not self.is_cacheable(request):
+            return self.dumps(await build())
+
+        key: str = self.make_key(request, params)
+        try:
+            version, value = await get_async_redis().mget(RedisKey.BLOG_CACHE_VERSION, key)
+        except RedisError:
+            data_json: Optional[str] = self.local.get(key)
+            if data_json is None:
+                data_json = await self.single_flight.ado(('local', key), lambda: self._adumps(build))
+                self.local.set(key, data_json)
+            return data_json
+        version = version or '0'
+        data_json, fresh = self.parse(value, version)
+        if fresh:
+            return data_json
+        data_json, fresh = await self.single_flight.ado(
+            key, lambda: self.arebuild(key, version, build, ttl, data_json)
+        )
+        if not fresh:
+            self.mark_stale(request)
+        return data_json
+
+    async def arebuild(
+            self, key: str, version: str, build: Callable[[], Awaitable[Any]], ttl: Optional[int], stale: Optional[str]
+    ) -> tuple[str, bool]:
+        """rebuild的异步版本"""
+        async_redis = get_async_redis()
+        try:
+            lock = async_redis.lock(RedisKey.BLOG_CACHE_LOCK.format(key), timeout=self.lock_timeout)
+            locked: bool = await lock.acquire(blocking=False)
+        except RedisError:
+            lock, locked = None, False
+        if lock is not None and not locked:
+            if stale is not None:
+                return stale, False
+            data_json: Optional[str] = await self.await_rebuild(key, version)
+            if data_json is not None:
+                return data_json, True
+        try:
+            data_json: str = await self._adumps(build)
+            value, timeout = self.pack(version, data_json, ttl)
+            try:
+                await async_redis.set(key, value, ex=timeout)
+            except RedisError:
+                pass
+            return data_json, True
+        finally:
+            if locked:
+                try:
+                    await lock.release()
+                except RedisError:
+                    pass
+
+    async def await_rebuild(self, key: str, version: str) -> Optional[str]:
+        """wait的异步版本"""
+        deadline: float = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                data_json, fresh = self.parse(await get_async_redis().get(key), version)
+            except RedisError:
+                return None
+            if fresh:
+                return data_json
+        return None
+
+    async def _adumps(self, build: Callable[[], Awaitable[Any]]) -> str:
+        return self.dumps(await build())
+
+    def dumps(self, data: Any) -> str:
+        # 与响应使用相同的序列化器，时间字段直接按接口格式输出
+        return json_serializer.dumps(data).decode('utf-8')
+
+    def bump(self) -> None:
+        """内容变更后递增版本号，使所有前台缓存失效"""
+        self.local.clear()
+        try:
+            redis.incr(RedisKey.BLOG_CACHE_VERSION)
+        except RedisError:
+            # 数据已经写入db，不让写操作失败，redis恢复后再递增，使不可用期间之前的缓存失效
+            redis_breaker.defer('response_cache.bump', self.bump)
+
+
+class PermissionCache:
+    """用户权限缓存，进程内LRU + redis两级
+
+    缓存内容为 {'is_active': bool, 'is_admin': bool, 'keys': list[str]}，
+    权限组、组成员、用户状态变化时调用invalidate()。
+    invalidate只能清理当前进程的LRU，其他进程的LRU最多延迟local_ttl秒失效，所以local_ttl不宜过长。
+    """
+    # redis缓存过期时间，单位秒，失效没能清理redis时最多这么久之后以db为准，不宜过长
+    timeout: int = 5 * 60
+    # 进程内缓存过期时间，单位秒
+    local_ttl: float = 10
+    # 没能删除redis缓存时登记的补做名，{0} => user id
+    deferred_name: str = 'permission_cache.invalidate.{0}'
+
+    def __init__(self):
+        self.local = LRUCache(maxsize=256, ttl=self.local_ttl)
+
+    def get(self, user_id: int) -> dict:
+        """获取用户状态和权限key，用户不存在时抛出ObjectDoesNotExist"""
+        permission: Optional[dict] = self.local.get(user_id)
+        if permission is not None:
+            return permission
+
+        key: str = RedisKey.BLOG_USER_PERMISSION.format(user_id)
+        value: Optional[str] = None
+        # 删除redis缓存还在等待补做时，redis里的是旧权限，直接查db
+        if not redis_breaker.is_deferred(self.deferred_name.format(user_id)):
+            try:
+                value = redis.get(key)
+            except RedisError:
+                pass
+        if value is not None:
+            permission = json.loads(value)
+        else:
+            permission = self.load(user_id)
+            try:
+                redis.set(key, json.dumps(permission), ex=self.timeout)
+            except RedisError:
+                pass
+        self.local.set(user_id, permission)
+        return permission
+
+    def load(self, user_id: int) -> dict:
+        """从db加载用户权限，两次查询，权限key用一次join查出"""
+        user: dict = User.objects.values('is_active', 'is_admin').get(id=user_id)
+        names: QuerySet = Permission.objects.filter(group__user=user_id).values_list('name', flat=True)
+        user['keys'] = list(set(names))
+        return user
+
+    def invalidate(self, *user_ids: int) -> None:
+        """清理用户的权限缓存和当前进程中的token缓存，redis不可用时登记补做"""
+        if not user_ids:
+            return
+        # token缓存只在进程内，不受redis是否可用影响
+        token_cache.revoke(*user_ids)
+        for user_id in user_ids:
+            self.local.delete(user_id)
+        keys: list[str] = [RedisKey.BLOG_USER_PERMISSION.format(user_id) for user_id in user_ids]
+        try:
+            redis.delete(*keys)
+        except RedisError:
+            # db已经写入，不让写操作失败，redis恢复后再删除，否则恢复后会继续使用旧权限
+            for user_id, key in zip(user_ids, keys):
+                redis_breaker.defer(self.deferred_name.format(user_id), partial(redis.delete, key))
+
+
+class TokenCache:
+    """已校验token的进程内缓存，token的sha256 => payload
+
+    同一个token重复请求时跳过jwt解码和签名校验，缓存时间不超过token的剩余有效期，
+    命中后仍然由调用方对比expire_time，过期判断和不缓存时完全一致。
+    用户状态或权限变化时由permission_cache.invalidate()调用revoke()清理当前进程中该用户的token，
+    其他进程的缓存不受影响，由之后的用户状态校验（permission_cache）拒绝。
+    """
+    maxsize: int = 1024
+
+    def __init__(self):
+        self.local = LRUCache(maxsize=self.maxsize)
+
+    def make_key(self, token: str) -> str:
+        # 不在内存中保存token原文
+        return hashlib.sha256(token.encode(encoding='utf-8')).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        payload: Optional[dict] = self.local.get(self.make_key(token))
+        # 返回副本，避免view修改缓存中的payload
+        return dict(payload) if payload is not None else None
+
+    def set(self, token: str, payload: dict) -> None:
+        ttl: float = payload['expire_time'] - time.time()
+        if ttl > 0:
+            self.local.set(self.make_key(token), dict(payload), ttl=ttl)
+
+    def revoke(self, *user_ids: int) -> None:
+        """清理用户的全部token缓存"""
+        user_ids_set: set[int] = set(user_ids)
+        self.local.delete_if(lambda payload: payload.get('id') in user_ids_set)
+
+
+class MenuCache:
+    """后台侧边栏菜单缓存，进程内按权限key集合缓存序列化好的菜单，管理员单独一份
+
+    菜单只由Authority.json和用户的权限key集合决定，权限组的权限变化后用户的key集合跟着变化，
+    会命中另一份缓存，不需要清理；Authority.json的版本号也是key的一部分，热更新后自然失效。
+    """
+    # 不同的权限组合通常很少，容量只是兜底
+    maxsize: int = 128
+    ttl: float = 24 * 60 * 60
+
+    def __init__(self):
+        self.local = LRUCache(maxsize=self.maxsize, ttl=self.ttl)
+
+    def get_or_set(self, keys: list[str], is_admin: bool, version: str, build: Callable[[], list[dict]]) -> str:
+        """返回菜单的json字符串，未命中时调用build生成菜单
+
+        Args:
+            version: Authority.json的版本号
+        """
+        key: Hashable = (version, 'admin' if is_admin else frozenset(keys))
+        menu_json: Optional[str] = self.local.get(key)
+        if menu_json is None:
+            menu_json = json_serializer.dumps(build()).decode('utf-8')
+            self.local.set(key, menu_json)
+        return menu_json
+
+
+class TagRegistry:
+    """标签 id <=> name 双向映射，进程内 + redis两级缓存
+
+    redis保存全局版本号，只有创建标签时递增；映射hash另存一个版本号，只有版本号变化时才读取整个hash。
+    进程内映射每隔check_interval秒对比一次版本号，查找不到的id或name会立即对比，
+    所以其他进程新建的标签也能马上查到，其余情况都是字典查找。
+    立即对比之后仍然查不到的id或name缓存miss_ttl秒，前台用不存在的标签名筛选时不会每次都访问redis。
+    """
+    # 进程内映射对比版本号的间隔，单位秒
+    check_interval: float = 5
+    # 查不到的id或name的缓存时间，单位秒
+    miss_ttl: float = 5
+    # 标签名最大长度，和Tag.name一致
+    max_name_length: int = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._checked_at: float = 0
+        # 刷新时整体替换，不修改已有字典，读取时不需要加锁
+        self._names: dict[int, str] = {}
+        self._ids: dict[str, int] = {}
+        # ('id', tag_id) | ('name', name) => 当时的版本号
+        self._misses = LRUCache(maxsize=1024, ttl=self.miss_ttl)
+
+    def get_map(self) -> dict[int, str]:
+        """id => name"""
+        self.refresh()
+        return self._names
+
+    def get_name(self, tag_id: int) -> Optional[str]:
+        self.refresh()
+        if tag_id not in self._names:
+            self.refresh_for_miss(('id', tag_id))
+        return self._names.get(tag_id)
+
+    def get_names(self, tag_ids: list[int]) -> list[str]:
+        self.refresh()
+        missing_ids: list[int] = [tag_id for tag_id in tag_ids if tag_id not in self._names]
+        if missing_ids:
+            self.refresh_for_miss(*[('id', tag_id) for tag_id in missing_ids])
+        names: dict[int, str] = self._names
+        return [names[tag_id] for tag_id in tag_ids if tag_id in names]
+
+    def get_id(self, name: str) -> Optional[int]:
+        self.refresh()
+        if name not in self._ids:
+            self.refresh_for_miss(('name', name))
+        return self._ids.get(name)
+
+    def refresh_for_miss(self, *keys: tuple[str, Any]) -> None:
+        """查不到时立即对比版本号，最近已经对比过仍然查不到的不再对比"""
+        if all(self._misses.get(key) is not None for key in keys):
+            return
+        self.refresh(force=True)
+        for key in keys:
+            kind, value = key
+            if value not in (self._names if kind == 'id' else self._ids):
+                self._misses.set(key, self._version or '')
+
+    def names_to_ids(self, tag_names: list[str]) -> list[int]:
+        """给定标签name列表，按顺序返回id列表，如果标签name不存在，则创建"""
+        # 去重并保持顺序
+        tag_names = list(dict.fromkeys(tag_names))
+        too_long: list[str] = [name for name in tag_names if len(name) > self.max_name_length]
+        if too_long:
+            raise ValueError('标签名称不能超过{0}个字：{1}'.format(self.max_name_length, '、'.join(too_long)))
+        self.refresh()
+        if any(name not in self._ids for name in tag_names):
+            self.refresh(force=True)
+            names_not_exist: list[str] = [name for name in tag_names if name not in self._ids]
+            if names_not_exist:
+                self.create(names_not_exist)
+        ids: dict[str, int] = self._ids
+        return [ids[name] for name in tag_names]
+
+    def create(self, names: list[str]) -> None:
+        """创建标签，Tag.name唯一，多个进程同时创建同名标签时只有一个生效"""
+        # 新建的标签不再是miss
+        self._misses.clear()
+        # redis锁只用来减少冲突，拿不到锁或者redis不可用时也可以继续，由唯一约束保证不重复
+        try:
+            lock = redis.lock(RedisKey.BLOG_TAG_LOCK, timeout=10, blocking_timeout=5)
+            locked: bool = lock.acquire()
+        except RedisError:
+            lock, locked = None, False
+        try:
+            names_exist: set[str] = set(Tag.objects.filter(name__in=names).values_list('name', flat=True))
+            objs: list[Tag] = [Tag(name=name) for name in names if name not in names_exist]
+            if objs:
+                Tag.objects.bulk_create(objs, ignore_conflicts=True)
+                try:
+                    redis.incr(RedisKey.BLOG_TAG_VERSION)
+                except RedisError:
+                    # redis恢复后再递增，否则其他进程会一直使用redis中没有新标签的映射
+                    redis_breaker.defer('tag_registry.version', lambda: redis.incr(RedisKey.BLOG_TAG_VERSION))
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except RedisError:
+                    pass
+        self.refresh(force=True, from_db=True)
+
+    def refresh(self, force: bool = False, from_db: bool = False) -> None:
+        """对比版本号，版本变化时重新加载映射
+
+        Args:
+            force: 忽略check_interval，立即对比版本号
+            from_db: 跳过redis中的映射，从db加载
+        """
+        now: float = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                version, map_version = redis.mget(RedisKey.BLOG_TAG_VERSION, RedisKey.BLOG_TAG_MAP_VERSION)
+                version = version or '0'
+                if version == self._version and not from_db:
+                    return
+                if map_version == version and not from_db:
+                    # 版本号变化时才读取整个映射
+                    names: dict[str, str] = redis.hgetall(RedisKey.BLOG_TAG_MAP)
+                    self._set_names({int(tag_id): name for tag_id, name in names.items()}, version)
+                    return
+            except RedisError:
+                # redis不可用时，已经加载过就继续使用，否则从db加载
+                if from_db or self._version is None:
+                    self._set_names(self.load(), '')
+                return
+            # redis中的映射过期，从db加载后写回redis
+            names = self.load()
+            try:
+                pipe = redis.pipeline(transaction=True)
+                pipe.delete(RedisKey.BLOG_TAG_MAP)
+                if names:
+                    pipe.hset(RedisKey.BLOG_TAG_MAP, mapping=names)
+                pipe.set(RedisKey.BLOG_TAG_MAP_VERSION, version)
+                pipe.execute()
+            except RedisError:
+                pass
+            self._set_names(names, version)
+
+    def load(self) -> dict[int, str]:
+        return dict(Tag.objects.values_list('id', 'name'))
+
+    def _set_names(self, names: dict[int, str], version: str) -> None:
+        self._names = names
+        self._ids = {name: tag_id for tag_id, name in names.items()}
+        self._version = version
+
+
+class RequestScope:
+    """一次请求内共享的缓存
+
+    组合接口在进程内执行多个子请求时开启，子请求共用同一份标签映射、分类映射等，
+    每份数据在一次组合请求中只加载一次。没有开启时get直接调用build，不做缓存。
+    run_sync会复制context到线程中，线程里的子请求拿到的是同一个字典。
+    """
+
+    def __init__(self):
+        self._values: ContextVar[Optional[dict[str, Any]]] = ContextVar('request_scope', default=None)
+
+    @contextmanager
+    def open(self) -> Iterator[None]:
+        token = self._values.set({})
+        try:
+            yield
+        finally:
+            self._values.reset(token)
+
+    def get(self, key: str, build: Callable[[], Any]) -> Any:
+        values: Optional[dict[str, Any]] = self._values.get()
+        if values is None:
+            return build()
+        if key not in values:
+            values[key] = build()
+        return values[key]
+
+
+response_cache = ResponseCache()
+permission_cache = PermissionCache()
+token_cache = TokenCache()
+menu_cache = MenuCache()
+tag_registry = TagRegistry()
+request_scope = RequestScope()
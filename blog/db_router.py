@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import time
+import random
+import logging
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+from redis import RedisError
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from blog import redis, get_async_redis
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+logger = logging.getLogger('blog')
+
+
+class ReplicaChoice:
+    """一次请求的只读库选择
+
+    第一次读查询时才选择，命中响应缓存不查库的请求不用检查主库标记和只读库状态。
+    请求中放到线程里执行的查询共用同一个对象，只选择一次。
+    """
+
+    def __init__(self):
+        self._chosen: bool = False
+        self._alias: Optional[str] = None
+
+    @property
+    def alias(self) -> Optional[str]:
+        """读查询使用的只读库，需要走主库时为None"""
+        if not self._chosen:
+            self._alias = replica_selector.choose()
+            self._chosen = True
+        return self._alias
+
+    @property
+    def chosen_alias(self) -> Optional[str]:
+        """已经选择的只读库，还没有读查询或者走了主库时为None"""
+        return self._alias
+
+
+# 当前请求的只读库选择，None时走主库
+current_replica: ContextVar[Optional[ReplicaChoice]] = ContextVar('current_replica', default=None)
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS使用，写总是走主库，读只有在view指定了只读库时才走只读库"""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        choice: Optional[ReplicaChoice] = current_replica.get()
+        return choice.alias if choice is not None else None
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # 只读库是主库的副本，对象之间可以关联
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints) -> bool:
+        # 只读库的表结构通过主从复制同步
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaSelector:
+    """选择前台读接口使用的只读库
+
+    写请求执行前在redis里设置主库标记，标记存在的REPLICA_PIN_SECONDS秒内所有读都走主库，
+    保证管理员写完之后在前台能读到自己的修改，也避免缓存从还没同步的只读库读到旧数据。
+    只读库的可用性和复制延迟每隔check_interval秒检查一次，连不上或者延迟超过REPLICA_MAX_LAG的只读库不使用，
+    没有可用的只读库时回退到主库。
+    """
+    # 只读库状态的检查间隔，单位秒
+    check_interval: float = 5
+
+    def __init__(self):
+        # alias => (检查时间, 是否可用)
+        self._status: dict[str, tuple[float, bool]] = {}
+        # 已知的主库标记过期时间，之前的读不用再查redis
+        self._pinned_until: float = 0
+
+    @property
+    def aliases(self) -> list[str]:
+        return settings.DATABASE_REPLICAS
+
+    def choose(self) -> Optional[str]:
+        """随机返回一个可用的只读库，需要走主库时返回None"""
+        if not self.aliases or self.is_pinned():
+            return None
+        available: list[str] = [alias for alias in self.aliases if self.is_available(alias)]
+        return random.choice(available) if available else None
+
+    def pin(self) -> None:
+        """写请求执行前调用，一段时间内的读都走主库"""
+        if not self.aliases:
+            return
+        self._pinned_until = time.monotonic() + settings.REPLICA_PIN_SECONDS
+        try:
+            redis.set(RedisKey.BLOG_DB_PRIMARY_PIN, 1, ex=settings.REPLICA_PIN_SECONDS)
+        except RedisError:
+            # redis不可用时is_pinned也读不到标记，同样走主库
+            pass
+
+    async def apin(self) -> None:
+        """同pin，使用异步redis客户端"""
+        if not self.aliases:
+            return
+        self._pinned_until = time.monotonic() + settings.REPLICA_PIN_SECONDS
+        try:
+            await get_async_redis().set(RedisKey.BLOG_DB_PRIMARY_PIN, 1, ex=settings.REPLICA_PIN_SECONDS)
+        except RedisError:
+            pass
+
+    def is_pinned(self) -> bool:
+        """标记存在时记下剩余时间，过期之前不再查redis；没有标记时每次都要查，其他进程随时可能写入"""
+        if time.monotonic() < self._pinned_until:
+            return True
+        try:
+            ttl: int = redis.pttl(RedisKey.BLOG_DB_PRIMARY_PIN)
+        except RedisError:
+            # 无法确认最近有没有写操作，保守地走主库
+            return True
+        if ttl > 0:
+            self._pinned_until = time.monotonic() + ttl / 1000
+        # -2表示标记不存在
+        return ttl != -2
+
+    def is_available(self, alias: str) -> bool:
+        checked_at, available = self._status.get(alias, (0, False))
+        if time.monotonic() - checked_at > self.check_interval:
+            available = self.check(alias)
+            self._status[alias] = (time.monotonic(), available)
+        return available
+
+    def mark_down(self, alias: str) -> None:
+        """查询时连接失败，check_interval秒内不再使用该只读库"""
+        self._status[alias] = (time.monotonic(), False)
+
+    def check(self, alias: str) -> bool:
+        """检查只读库能否连接，以及复制延迟是否在REPLICA_MAX_LAG以内"""
+        try:
+            lag: Optional[float] = self.get_lag(alias)
+        except DatabaseError:
+            logger.warning('只读库%s连接失败，读请求回退到主库', alias, exc_info=True)
+            return False
+        if lag is None or lag > settings.REPLICA_MAX_LAG:
+            logger.warning('只读库%s复制延迟%s秒，读请求回退到主库', alias, lag)
+            return False
+        return True
+
+    def get_lag(self, alias: str) -> Optional[float]:
+        """获取复制延迟秒数，复制中断时返回None，不支持查询延迟的数据库（e.g. 本地SQLite）返回0"""
+        connection = connections[alias]
+        connection.ensure_connection()
+        if connection.vendor != 'mysql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW SLAVE STATUS')
+            row: Optional[tuple] = cursor.fetchone()
+            if row is None:
+                # 没有复制状态，e.g. 云数据库的只读实例，视为没有延迟
+                return 0
+            columns: list[str] = [column[0] for column in cursor.description]
+        return row[columns.index('Seconds_Behind_Master')]
+
+
+replica_selector = ReplicaSelector()
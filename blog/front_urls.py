@@ -2,7 +2,10 @@ from django.urls import path
 
 from blog.views.blog.archive_view import ArchiveView
 from blog.views.blog.article_view import ArticleView, ArticlesView
+from blog.views.blog.bundle_view import BundleView
+from blog.views.blog.hot_view import HotView
 from blog.views.blog.mood_view import MoodsView
+from blog.views.blog.search_view import SearchView
 from blog.views.blog.tag_view import TagMapView
 from blog.views.system.record_view import RecordsView
 
@@ -12,5 +15,8 @@ urlpatterns = [
     path('archive', ArchiveView.as_view()),
     path('tagMap', TagMapView.as_view()),
     path('records', RecordsView.as_view()),
-    path('moods', MoodsView.as_view())
+    path('moods', MoodsView.as_view()),
+    path('search', SearchView.as_view()),
+    path('hot', HotView.as_view()),
+    path('bundle', BundleView.as_view())
 ]
@@ -0,0 +1,203 @@
+import json
+import time
+import logging
+import statistics
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from blog.models import Article, Category, Group, Tag, User
+from blog.views.base_view import TokenMixin
+
+
+class Scenario:
+    """压测的一个接口请求"""
+
+    def __init__(self, name: str, method: str, path: str, data: Optional[dict] = None, auth: bool = False):
+        self.name: str = name
+        self.method: str = method
+        self.path: str = path
+        self.data: Optional[dict] = data
+        # 后台接口带管理员token
+        self.auth: bool = auth
+
+
+class Command(BaseCommand):
+    help = (
+        '用测试客户端逐个压测前台和后台接口，输出p50/p95/p99延迟、吞吐量和每次请求的sql数，并和基线对比。'
+        '本地使用 BLOG_ENV_FILE=blog_backend/env.bench.json（SQLite + fakeredis），先执行seed_data生成数据'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='每个接口的请求数')
+        parser.add_argument('--warmup', type=int, default=20, help='每个接口正式计时前的预热请求数，用于填充缓存')
+        parser.add_argument('--only', action='append', help='只压测名称包含该字符串的接口，可以传多个')
+        parser.add_argument('--baseline', default='benchmark_baseline.json', help='基线文件路径')
+        parser.add_argument('--save', action='store_true', help='把本次结果保存为基线')
+        parser.add_argument('--threshold', type=float, default=0.2, help='p95比基线慢超过该比例视为退化')
+        parser.add_argument('--fail-on-regression', action='store_true', help='有退化时以非0状态码退出，用于CI')
+
+    def handle(self, *args, **options):
+        # 允许测试客户端的testserver host
+        setup_test_environment()
+        # 每个请求一行的性能日志会干扰输出和计时
+        logging.getLogger('blog.metrics').setLevel(logging.WARNING)
+        self.client = Client()
+        self.token: str = self.get_admin_token()
+        scenarios: list[Scenario] = self.get_scenarios()
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios if any(name in scenario.name for name in options['only'])]
+
+        results: dict[str, dict] = {}
+        for scenario in scenarios:
+            results[scenario.name] = self.run(scenario, options['requests'], options['warmup'])
+        baseline: dict[str, dict] = self.load_baseline(options['baseline'])
+        regressions: list[str] = self.report(results, baseline, options['threshold'])
+
+        if options['save']:
+            with open(options['baseline'], 'w') as file:
+                json.dump({'created': str(datetime.now()), 'results': results}, file, ensure_ascii=False, indent=2)
+            self.stdout.write('基线已保存到{0}'.format(options['baseline']))
+        if regressions and options['fail_on_regression']:
+            raise CommandError('性能退化：{0}'.format(', '.join(regressions)))
+
+    def get_admin_token(self) -> str:
+        admin: Optional[User] = User.objects.filter(is_admin=True, is_active=True).order_by('id').first()
+        if admin is None:
+            raise CommandError('没有可用的管理员，请先执行seed_data')
+        return 'Bearer {0}'.format(TokenMixin().encode_token({'id': admin.id, 'username': admin.username}))
+
+    def get_scenarios(self) -> list[Scenario]:
+        """用库里的真实数据拼接口参数"""
+        article: Optional[Article] = Article.objects.order_by('-update_time').first()
+        if article is None:
+            raise CommandError('没有文章数据，请先执行seed_data')
+        category: Optional[Category] = Category.objects.order_by('id').first()
+        tag: Optional[Tag] = Tag.objects.annotate(count=Count('articletag')).order_by('-count').first()
+        group: Optional[Group] = Group.objects.order_by('id').first()
+        month: str = article.create_time.strftime('%Y-%m')
+        word: str = article.title.split()[0][:2] if article.title.strip() else '性能'
+
+        scenarios: list[Scenario] = [
+            Scenario('front 文章列表', 'get', '/front/articles'),
+            Scenario('front 文章列表 分页', 'get', '/front/articles', {'pagination': '{"page_size": 20}'}),
+            Scenario('front 文章列表 月份', 'get', '/front/articles', {'filters': json.dumps({'month': month})}),
+            Scenario('front 文章详情', 'get', '/front/article', {'id': article.id}),
+            Scenario('front 文章阅读', 'get', '/front/article', {'id': article.id, '_ref': 'front', 'html': 'true'}),
+            Scenario('front 分类归档', 'get', '/front/archive', {'cate': 'category'}),
+            Scenario('front 标签归档', 'get', '/front/archive', {'cate': 'tag'}),
+            Scenario('front 月份归档', 'get', '/front/archive', {'cate': 'month'}),
+            Scenario('front 标签映射', 'get', '/front/tagMap'),
+            Scenario('front 说说', 'get', '/front/moods'),
+            Scenario('front 更新记录', 'get', '/front/records'),
+            Scenario('front 搜索', 'get', '/front/search', {'q': word}),
+            Scenario('front 热门文章', 'get', '/front/hot', {'limit': 10}),
+            Scenario('front 热门文章 7天', 'get', '/front/hot', {'days': 7, 'limit': 10}),
+            Scenario('front 首页组合', 'get', '/front/bundle'),
+            Scenario('back 文章列表', 'get', '/back/blog/articles', auth=True),
+            Scenario('back 文章详情', 'get', '/back/blog/article', {'id': article.id}, auth=True),
+            Scenario('back 修改文章', 'put', '/back/blog/article', {
+                'id': article.id, 'title': article.title, 'body': article.body,
+                'category_id': article.category_id or 0, 'tags': list(Tag.objects.filter(
+                    id__in=article.tags).values_list('name', flat=True)),
+            }, auth=True),
+            Scenario('back 分类列表', 'get', '/back/blog/categories', auth=True),
+            Scenario('back 说说', 'get', '/back/blog/moods', auth=True),
+            Scenario('back 用户列表', 'get', '/back/system/users', auth=True),
+            Scenario('back 权限组列表', 'get', '/back/system/groups', auth=True),
+            Scenario('back 菜单', 'get', '/back/system/menu', auth=True),
+            Scenario('back 权限树', 'get', '/back/system/permission/tree', auth=True),
+        ]
+        if category is not None:
+            scenarios.append(Scenario('front 文章列表 分类', 'get', '/front/articles', {
+                'filters': json.dumps({'category_name': category.name}, ensure_ascii=False)
+            }))
+            scenarios.append(Scenario('back 分类详情', 'get', '/back/blog/category', {'id': category.id}, auth=True))
+        if tag is not None:
+            scenarios.append(Scenario('front 文章列表 标签', 'get', '/front/articles', {
+                'filters': json.dumps({'tag_name': tag.name}, ensure_ascii=False)
+            }))
+        if group is not None:
+            scenarios.append(Scenario('back 组成员', 'get', '/back/system/group/members', {'group': group.id}, auth=True))
+            scenarios.append(Scenario(
+                'back 组权限', 'get', '/back/system/group/permission', {'group': group.id}, auth=True
+            ))
+        return scenarios
+
+    def request(self, scenario: Scenario):
+        headers: dict = {'HTTP_AUTHORIZATION': self.token} if scenario.auth else {}
+        if scenario.method == 'get':
+            return self.client.get(scenario.path, scenario.data, **headers)
+        return getattr(self.client, scenario.method)(
+            scenario.path, json.dumps(scenario.data or {}), content_type='application/json', **headers
+        )
+
+    def run(self, scenario: Scenario, requests: int, warmup: int) -> dict:
+        for _ in range(warmup):
+            self.request(scenario)
+
+        latencies: list[float] = []
+        queries: int = 0
+        errors: int = 0
+        for _ in range(requests):
+            # 前台接口的查询可能走只读库，统计所有连接上的sql
+            with ExitStack() as stack:
+                contexts: list[CaptureQueriesContext] = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+                ]
+                start: float = time.perf_counter()
+                response = self.request(scenario)
+                # 流式响应需要读完才算结束
+                content: bytes = b''.join(response.streaming_content) if response.streaming else response.content
+                latencies.append(time.perf_counter() - start)
+            queries += sum(len(context.captured_queries) for context in contexts)
+            if response.status_code != 200 or json.loads(content).get('ret') != 0:
+                errors += 1
+
+        quantiles: list[float] = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'p50_ms': round(quantiles[49] * 1000, 3),
+            'p95_ms': round(quantiles[94] * 1000, 3),
+            'p99_ms': round(quantiles[98] * 1000, 3),
+            'rps': round(len(latencies) / sum(latencies), 1),
+            'queries': round(queries / requests, 2),
+            'errors': errors,
+        }
+
+    def load_baseline(self, path: str) -> dict[str, dict]:
+        try:
+            with open(path) as file:
+                return json.load(file)['results']
+        except FileNotFoundError:
+            return {}
+
+    def report(self, results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+        """输出结果表格，有基线时附加p95和sql数的变化，返回退化的接口名"""
+        regressions: list[str] = []
+        # 接口名有中文，放在最后一列，数字列才能对齐
+        self.stdout.write('{0:>9}{1:>9}{2:>9}{3:>9}{4:>7}{5:>5}  {6:<26}{7}'.format(
+            'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'sql', 'err', '对比基线', '接口'
+        ))
+        for name, result in results.items():
+            compare: str = ''
+            base: Optional[dict] = baseline.get(name)
+            if base:
+                p95_change: float = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+                compare = 'p95 {0:+.0%}  sql {1:+g}'.format(p95_change, round(result['queries'] - base['queries'], 2))
+                # 小于0.5ms的波动视为噪音；sql数偶尔因为缓存刷新多一次，平均多0.5次以上才算
+                slower: bool = p95_change > threshold and result['p95_ms'] - base['p95_ms'] > 0.5
+                more_queries: bool = result['queries'] - base['queries'] >= 0.5
+                if slower or more_queries or result['errors'] > base['errors']:
+                    regressions.append(name)
+                    compare += '  退化'
+            self.stdout.write('{0:>9.2f}{1:>9.2f}{2:>9.2f}{3:>9.1f}{4:>7g}{5:>5}  {6:<26}{7}'.format(
+                result['p50_ms'], result['p95_ms'], result['p99_ms'], result['rps'],
+                result['queries'], result['errors'], compare, name
+            ))
+        return regressions
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import Client, AsyncClient
+from django.test.utils import setup_test_environment
+
+import blog
+
+
+class Command(BaseCommand):
+    help = '对比前台接口在WSGI（线程并发）和ASGI（协程并发）下的吞吐量和延迟，只发送GET请求'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', help='请求路径，可以传多个，默认为前台主要读接口')
+        parser.add_argument('--requests', type=int, default=500, help='每个路径的请求数')
+        parser.add_argument('--concurrency', type=int, default=50, help='并发数')
+
+    def handle(self, *args, **options):
+        # 允许测试客户端的testserver host
+        setup_test_environment()
+        paths: list[str] = options['path'] or [
+            '/front/articles', '/front/archive', '/front/archive?cate=tag', '/front/moods'
+        ]
+        for path in paths:
+            self.stdout.write(path)
+            self.report('wsgi', *self.run_wsgi(path, options['requests'], options['concurrency']))
+            self.report('asgi', *self.run_asgi_mode(path, options['requests'], options['concurrency']))
+
+    def run_wsgi(self, path: str, requests: int, concurrency: int) -> (float, list[float]):
+        client = Client()
+
+        def request() -> float:
+            start: float = time.perf_counter()
+            client.get(path)
+            return time.perf_counter() - start
+
+        start: float = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies: list[float] = list(executor.map(lambda _: request(), range(requests)))
+        return time.perf_counter() - start, latencies
+
+    def run_asgi_mode(self, path: str, requests: int, concurrency: int) -> (float, list[float]):
+        """命令在WSGI模式下启动，ASGI压测期间切换到ASGI模式，异步view使用redis.asyncio客户端，结束后恢复"""
+        asgi: bool = blog.ASGI
+        blog.ASGI = True
+        try:
+            return asyncio.run(self.run_asgi(path, requests, concurrency))
+        finally:
+            blog.ASGI = asgi
+
+    async def run_asgi(self, path: str, requests: int, concurrency: int) -> (float, list[float]):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request() -> float:
+            async with semaphore:
+                start: float = time.perf_counter()
+                await client.get(path)
+                return time.perf_counter() - start
+
+        start: float = time.perf_counter()
+        latencies: list[float] = await asyncio.gather(*[request() for _ in range(requests)])
+        elapsed: float = time.perf_counter() - start
+        # 异步客户端的连接和事件循环绑定，asyncio.run结束前关闭
+        await blog.close_async_redis()
+        return elapsed, latencies
+
+    def report(self, name: str, elapsed: float, latencies: list[float]) -> None:
+        quantiles: list[float] = statistics.quantiles(latencies, n=100)
+        self.stdout.write('  {0}: {1:.1f} req/s  p50 {2:.2f}ms  p95 {3:.2f}ms  p99 {4:.2f}ms'.format(
+            name, len(latencies) / elapsed, quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000
+        ))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from blog.db_router import replica_selector
+
+
+class Command(BaseCommand):
+    help = '检查只读库的连接和复制延迟，输出前台读接口当前是否会使用各个只读库'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('没有配置只读库，所有查询走主库')
+            return
+        for alias in settings.DATABASE_REPLICAS:
+            try:
+                lag = replica_selector.get_lag(alias)
+            except DatabaseError as e:
+                self.stdout.write('{0}: 连接失败 {1}'.format(alias, e))
+                continue
+            usable: bool = lag is not None and lag <= settings.REPLICA_MAX_LAG
+            self.stdout.write('{0}: 复制延迟{1}秒，{2}'.format(alias, lag, '可用' if usable else '不可用'))
+        if replica_selector.is_pinned():
+            self.stdout.write('最近{0}秒内有写操作，读请求暂时走主库'.format(settings.REPLICA_PIN_SECONDS))
@@ -0,0 +1,94 @@
+import re
+import json
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import QueryDict
+
+from blog.archive import archive_store
+from blog.models import Article, Category, Tag
+from blog.views.blog.article_view import ArticlesView
+
+# SQLite执行计划中的全表扫描，e.g. SCAN blog_article；走索引时为 SCAN blog_article USING INDEX xxx 或 SEARCH ...
+SQLITE_FULL_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+class Command(BaseCommand):
+    help = (
+        '用EXPLAIN检查文章列表和归档统计的查询是否走索引，文章表或标签关联表出现全表扫描时以非0状态码退出。'
+        '数据太少时MySQL可能直接全表扫描，先用seed_data生成数据，或者在生产库的只读库上执行'
+    )
+    # 只检查数据量大的表，分类等小表全表扫描不影响性能
+    large_tables: tuple[str, ...] = ('blog_article', 'blog_articletag')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='执行EXPLAIN的数据库')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('mysql', 'sqlite'):
+            raise CommandError('只支持MySQL和SQLite')
+        failures: list[str] = []
+        for name, queryset in self.get_querysets().items():
+            plan: list[dict] = self.explain(connection, queryset)
+            scans: list[str] = self.full_scans(connection.vendor, plan)
+            self.stdout.write('{0}: {1}'.format(name, '全表扫描 {0}'.format(', '.join(scans)) if scans else 'ok'))
+            for row in plan:
+                self.stdout.write('    {0}'.format(row['detail'] if 'detail' in row else json.dumps(row, default=str)))
+            if scans:
+                failures.append(name)
+        if failures:
+            raise CommandError('以下查询没有走索引：{0}'.format(', '.join(failures)))
+
+    def get_querysets(self) -> dict[str, QuerySet]:
+        """用view和归档统计中实际执行的查询"""
+        article: Optional[Article] = Article.objects.order_by('-update_time').first()
+        if article is None:
+            raise CommandError('没有文章数据，请先执行seed_data')
+        category: Optional[Category] = Category.objects.order_by('id').first()
+        tag: Optional[Tag] = Tag.objects.order_by('id').first()
+        page_size: int = ArticlesView.page_size + 1
+
+        querysets: dict[str, QuerySet] = {
+            '文章列表 第一页': self.articles({})[:page_size],
+            '文章列表 游标翻页': self.articles({}).filter(
+                Q(update_time__lt=article.update_time) | Q(update_time=article.update_time, id__lt=article.id)
+            )[:page_size],
+            '文章列表 月份': self.articles({'month': article.year_month}),
+        }
+        if category is not None:
+            querysets['文章列表 分类'] = self.articles({'category_name': category.name})[:page_size]
+        if tag is not None:
+            querysets['文章列表 标签'] = self.articles({'tag_ids': [tag.id]})[:page_size]
+        for cate, queryset in archive_store.count_querysets().items():
+            querysets['归档统计 {0}'.format(cate)] = queryset
+        return querysets
+
+    def articles(self, filters: dict) -> QuerySet:
+        params: QueryDict = QueryDict(mutable=True)
+        params['filters'] = json.dumps(filters, ensure_ascii=False)
+        return ArticlesView().get_articles_queryset(params, ArticlesView.list_fields)
+
+    def explain(self, connection, queryset: QuerySet) -> list[dict]:
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        prefix: str = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            columns: list[str] = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def full_scans(self, vendor: str, plan: list[dict]) -> list[str]:
+        """返回执行计划中全表扫描的大表"""
+        tables: list[str] = []
+        for row in plan:
+            if vendor == 'sqlite':
+                match = SQLITE_FULL_SCAN_PATTERN.match(row['detail'])
+                table: Optional[str] = match.group(1) if match else None
+            else:
+                # MySQL的type为ALL表示全表扫描，index表示按索引顺序扫描
+                table = row['table'] if row['type'] == 'ALL' else None
+            if table in self.large_tables:
+                tables.append(table)
+        return tables
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.tracking import last_login_buffer
+
+
+class Command(BaseCommand):
+    help = '把redis中缓冲的用户登录时间批量写回db，配合crontab定时执行'
+
+    def handle(self, *args, **options):
+        count: int = last_login_buffer.flush()
+        self.stdout.write('写入{0}个用户的登录时间'.format(count))
@@ -0,0 +1,18 @@
+from redis import WatchError
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.archive import archive_store
+
+
+class Command(BaseCommand):
+    help = '从db全量重建redis中的文章归档统计'
+
+    def handle(self, *args, **options):
+        try:
+            archive: dict = archive_store.rebuild()
+        except WatchError as e:
+            # 重建期间一直有文章写入，统计没有写入redis，稍后重试
+            raise CommandError(str(e))
+        self.stdout.write('分类{0}个，标签{1}个，月份{2}个'.format(
+            len(archive['category']), len(archive['tag']), len(archive['month'])
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import search_index
+
+
+class Command(BaseCommand):
+    help = '清空并重建redis中的文章搜索索引'
+
+    def handle(self, *args, **options):
+        count: int = search_index.rebuild()
+        self.stdout.write('已索引{0}篇文章'.format(count))
@@ -0,0 +1,205 @@
+import random
+import hashlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from blog import redis
+from blog.archive import archive_store
+from blog.cache import response_cache
+from blog.models import Article, ArticleTag, ArticleVisit, Category, Tag, Mood, Group, Permission, User
+from blog.render import markdown_renderer
+from blog.search import search_index
+from blog.services import RedisKey
+from blog.static_config import authority_config
+
+# 压测用户的密码
+PASSWORD: str = 'bench123'
+# 生成正文用的词，中英文混合
+WORDS: list[str] = (
+    '性能 优化 缓存 数据库 索引 查询 接口 并发 异步 线程 进程 内存 网络 延迟 吞吐 架构 部署 监控 日志 测试 '
+    '前端 后端 框架 组件 渲染 路由 权限 用户 文章 标签 分类 归档 搜索 分页 序列化 压缩 队列 事务 锁 '
+    'django redis mysql python vue nginx uwsgi docker linux http json api sql orm cache'
+).split()
+
+
+class Command(BaseCommand):
+    help = '生成压测数据：文章、标签、分类、说说、用户和权限组，数量分布接近真实博客'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=2000, help='文章数')
+        parser.add_argument('--tags', type=int, default=200, help='标签数')
+        parser.add_argument('--categories', type=int, default=20, help='分类数')
+        parser.add_argument('--moods', type=int, default=500, help='说说数')
+        parser.add_argument('--users', type=int, default=50, help='用户数，第一个为管理员')
+        parser.add_argument('--groups', type=int, default=5, help='权限组数')
+        parser.add_argument('--days', type=int, default=3 * 365, help='文章发布时间分布的天数')
+        parser.add_argument('--seed', type=int, default=0, help='随机数种子，相同种子生成相同数据')
+        parser.add_argument('--clear', action='store_true', help='生成前清空已有数据，重复生成时需要，否则用户名和组名重复')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.now: datetime = datetime.now().replace(microsecond=0)
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            categories: list[int] = self.seed_categories(options['categories'])
+            tags: list[int] = self.seed_tags(options['tags'])
+            self.seed_articles(options['articles'], categories, tags, options['days'])
+            self.seed_moods(options['moods'], options['days'])
+            groups: list[int] = self.seed_groups(options['groups'])
+            self.seed_users(options['users'], groups)
+        self.reset_caches()
+        self.copy_sqlite_replicas()
+        self.stdout.write('数据生成完成：{0}'.format(', '.join(
+            '{0} {1}'.format(model.__name__, model.objects.count())
+            for model in (Article, ArticleTag, Category, Tag, Mood, Group, Permission, User)
+        )))
+
+    def clear(self) -> None:
+        for model in (
+            ArticleTag, ArticleVisit, Article, Category, Tag, Mood, Permission, User.group.through, User, Group,
+        ):
+            model.objects.all().delete()
+
+    def zipf_weights(self, n: int, s: float = 1.1) -> list[float]:
+        """少数分类、标签占大部分文章"""
+        return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+    def text(self, words: int) -> str:
+        return ''.join(
+            word if '一' <= word[0] <= '鿿' else ' {0} '.format(word)
+            for word in self.random.choices(WORDS, k=words)
+        ).strip()
+
+    def markdown_body(self) -> str:
+        """正文长度按对数正态分布，中位数约两千字，夹带标题、列表和代码块"""
+        paragraphs: int = max(1, min(int(self.random.lognormvariate(2.3, 0.6)), 120))
+        parts: list[str] = []
+        for index in range(paragraphs):
+            if index % 4 == 0:
+                parts.append('## {0}'.format(self.text(3)))
+            roll: float = self.random.random()
+            if roll < 0.1:
+                parts.append('```python\n{0}\n```'.format('\n'.join(
+                    'print("{0}")'.format(self.text(3)) for _ in range(self.random.randint(2, 10))
+                )))
+            elif roll < 0.2:
+                parts.append('\n'.join('- {0}'.format(self.text(6)) for _ in range(self.random.randint(2, 6))))
+            else:
+                parts.append(self.text(self.random.randint(30, 120)))
+        return '\n\n'.join(parts)
+
+    def random_time(self, days: int) -> datetime:
+        # 越近的时间越密集
+        offset: float = min(self.random.expovariate(3 / days), days)
+        return self.now - timedelta(days=offset, seconds=self.random.randint(0, 86399))
+
+    def seed_categories(self, count: int) -> list[int]:
+        Category.objects.bulk_create([Category(name='分类{0}'.format(index)) for index in range(count)])
+        return list(Category.objects.order_by('-id').values_list('id', flat=True)[:count])
+
+    def seed_tags(self, count: int) -> list[int]:
+        Tag.objects.bulk_create([Tag(name='标签{0}'.format(index)) for index in range(count)])
+        return list(Tag.objects.order_by('-id').values_list('id', flat=True)[:count])
+
+    def seed_articles(self, count: int, categories: list[int], tags: list[int], days: int) -> None:
+        category_weights: list[float] = self.zipf_weights(len(categories))
+        tag_weights: list[float] = self.zipf_weights(len(tags))
+        articles: list[Article] = []
+        for index in range(count):
+            body: str = self.markdown_body()
+            # 约一成文章未分类
+            category_id = None
+            if categories and self.random.random() > 0.1:
+                category_id = self.random.choices(categories, category_weights)[0]
+            article_tags: list[int] = []
+            if tags:
+                article_tags = list(dict.fromkeys(self.random.choices(tags, tag_weights, k=self.random.randint(0, 5))))
+            articles.append(Article(
+                title=self.text(self.random.randint(3, 8))[:255],
+                body=body,
+                excerpt=markdown_renderer.convert(body)['excerpt'],
+                category_id=category_id,
+                tags=article_tags,
+            ))
+        # bulk_create不返回自增id，按插入顺序取回后再补充时间和关联表
+        Article.objects.bulk_create(articles, batch_size=500)
+        ids: list[int] = list(Article.objects.order_by('-id').values_list('id', flat=True)[:count])[::-1]
+        relations: list[ArticleTag] = []
+        for article, article_id in zip(articles, ids):
+            article.id = article_id
+            article.create_time = self.random_time(days)
+            article.update_time = min(article.create_time + timedelta(days=self.random.expovariate(1 / 30)), self.now)
+            article.year_month = article.create_time.strftime('%Y-%m')
+            relations.extend(ArticleTag(article_id=article_id, tag_id=tag_id) for tag_id in article.tags)
+        Article.objects.bulk_update(articles, ['create_time', 'update_time', 'year_month'], batch_size=500)
+        ArticleTag.objects.bulk_create(relations, batch_size=1000)
+
+    def seed_moods(self, count: int, days: int) -> None:
+        Mood.objects.bulk_create([
+            Mood(
+                content=self.text(self.random.randint(5, 40))[:255],
+                create_time=self.random_time(days),
+                is_visible=self.random.random() > 0.1,
+                is_deleted=self.random.random() < 0.05,
+            )
+            for _ in range(count)
+        ], batch_size=500)
+
+    def seed_groups(self, count: int) -> list[int]:
+        names: list[str] = ['压测组{0}'.format(index) for index in range(count)]
+        Group.objects.bulk_create([Group(name=name) for name in names])
+        groups: list[Group] = list(Group.objects.filter(name__in=names))
+        # 每个组随机分配一部分操作权限
+        keys: list[str] = sorted(set(authority_config.qualified_key_mapping.values()))
+        permissions: list[Permission] = []
+        for group in groups:
+            sample: list[str] = self.random.sample(keys, self.random.randint(1, len(keys))) if keys else []
+            permissions.extend(Permission(group=group, name=key) for key in sample)
+        Permission.objects.bulk_create(permissions)
+        return [group.id for group in groups]
+
+    def seed_users(self, count: int, groups: list[int]) -> None:
+        # 用户名最长15个字符，密码和登录接口一样存md5
+        password: str = hashlib.md5(PASSWORD.encode(encoding='utf-8')).hexdigest()
+        users: list[User] = [
+            User(
+                username='bench{0}'.format(index), password=password,
+                is_admin=index == 0, create_time=self.random_time(365)
+            )
+            for index in range(count)
+        ]
+        User.objects.bulk_create(users)
+        created: list[User] = list(User.objects.filter(username__in=[user.username for user in users]))
+        relations: list = []
+        for user in created:
+            if groups and not user.is_admin:
+                relations.extend(
+                    User.group.through(user_id=user.id, group_id=group_id)
+                    for group_id in self.random.sample(groups, self.random.randint(1, min(2, len(groups))))
+                )
+        User.group.through.objects.bulk_create(relations)
+
+    def reset_caches(self) -> None:
+        """直接写库绕过了各个缓存，统一失效，下次访问时重建"""
+        redis.incr(RedisKey.BLOG_TAG_VERSION)
+        redis.delete(RedisKey.BLOG_ARTICLE_VISIT_READY, RedisKey.BLOG_ARTICLE_HOT_READY)
+        archive_store.invalidate()
+        search_index.invalidate()
+        response_cache.bump()
+
+    def copy_sqlite_replicas(self) -> None:
+        """本地SQLite的只读库没有主从复制，生成数据后把主库整个复制过去"""
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            return
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            if replica.vendor == 'sqlite':
+                replica.ensure_connection()
+                primary.connection.backup(replica.connection)
+                self.stdout.write('已复制到只读库{0}'.format(alias))
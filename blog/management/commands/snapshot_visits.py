@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog.tracking import visit_counter
+
+
+class Command(BaseCommand):
+    help = '把redis中按天的文章访问增量写入db，配合crontab定时执行'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='首次上线时使用，把redis中已有的历史访问数一并写入db'
+        )
+
+    def handle(self, *args, **options):
+        if options['baseline']:
+            count: int = visit_counter.save_baseline()
+        else:
+            count: int = visit_counter.snapshot()
+        self.stdout.write('写入{0}条访问记录'.format(count))
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import re
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+from redis import StrictRedis
+from redis.client import Pipeline
+from redis.asyncio import StrictRedis as AsyncStrictRedis
+from redis.asyncio.client import Pipeline as AsyncPipeline
+
+from .breaker import redis_breaker
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Optional
+
+# sql中的 IN (%s, %s, ...) 参数个数不同也视为同一条sql
+IN_PLACEHOLDERS_PATTERN = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+class RequestMetrics:
+    """单次请求的性能数据，时间单位为秒
+
+    auth_time、handler_time 不包含其中的序列化时间，序列化单独记在serialize_time
+    """
+
+    def __init__(self, qualified_name: str):
+        self.qualified_name: str = qualified_name
+        self.auth_time: float = 0
+        self.handler_time: float = 0
+        self.serialize_time: float = 0
+        self.sql_count: int = 0
+        self.sql_time: float = 0
+        self.redis_count: int = 0
+        self.failed: bool = False
+        # 执行过的sql，参数用占位符表示，用于查询预算和N+1检测
+        self.sql_shapes: list[str] = []
+
+    def sql_wrapper(self, execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+        """connection.execute_wrapper使用，统计sql执行次数和时间"""
+        start: float = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - start
+            self.sql_shapes.append(IN_PLACEHOLDERS_PATTERN.sub('(%s...)', sql))
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.qualified_name,
+            'auth_ms': round(self.auth_time * 1000, 3),
+            'handler_ms': round(self.handler_time * 1000, 3),
+            'serialize_ms': round(self.serialize_time * 1000, 3),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'redis_count': self.redis_count,
+            'failed': self.failed,
+        }
+
+
+# 当前请求的性能数据，不在请求中时为None
+current_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('current_metrics', default=None)
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, raise_on_error: bool = True) -> list:
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if metrics is not None:
+            metrics.redis_count += len(self.command_stack)
+        return redis_breaker.call(super().execute, raise_on_error)
+
+
+class InstrumentedRedis(StrictRedis):
+    """统计当前请求执行的redis命令数，pipeline按其中的命令数计算；所有命令都经过熔断器"""
+
+    def execute_command(self, *args, **options) -> Any:
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if metrics is not None:
+            metrics.redis_count += 1
+        return redis_breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(AsyncPipeline):
+    async def execute(self, raise_on_error: bool = True) -> list:
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if metrics is not None:
+            metrics.redis_count += len(self.command_stack)
+        return await redis_breaker.acall(super().execute, raise_on_error)
+
+
+class InstrumentedAsyncRedis(AsyncStrictRedis):
+    """异步redis客户端，统计方式同InstrumentedRedis"""
+
+    async def execute_command(self, *args, **options) -> Any:
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if metrics is not None:
+            metrics.redis_count += 1
+        return await redis_breaker.acall(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedAsyncPipeline:
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class BlockingAsyncRedis:
+    """WSGI下代替异步redis客户端，接口和异步客户端一致，内部直接调用同步客户端
+
+    WSGI下请求线程本来就在等待这个请求，阻塞调用不会影响其他请求，同步客户端的连接池在请求之间复用。
+    """
+
+    class Lock:
+        def __init__(self, lock):
+            self._lock = lock
+
+        async def acquire(self, *args, **kwargs) -> bool:
+            return self._lock.acquire(*args, **kwargs)
+
+        async def release(self) -> None:
+            self._lock.release()
+
+    def __init__(self, client: InstrumentedRedis):
+        self._client: InstrumentedRedis = client
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method: Callable[..., Any] = getattr(self._client, name)
+
+        async def call(*args, **kwargs) -> Any:
+            return method(*args, **kwargs)
+
+        return call
+
+    def lock(self, *args, **kwargs) -> BlockingAsyncRedis.Lock:
+        return self.Lock(self._client.lock(*args, **kwargs))
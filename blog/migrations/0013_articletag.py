@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_article_tags(apps, schema_editor):
+    """根据Article.tags回填文章标签关联表"""
+    Article = apps.get_model('blog', 'Article')
+    ArticleTag = apps.get_model('blog', 'ArticleTag')
+    objs = []
+    for article_id, tags in Article.objects.values_list('id', 'tags').iterator():
+        for tag_id in set(tags or []):
+            objs.append(ArticleTag(article_id=article_id, tag_id=tag_id))
+    ArticleTag.objects.bulk_create(objs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_mood'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article', models.ForeignKey(
+                    db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='blog.article'
+                )),
+                ('tag', models.ForeignKey(
+                    db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='blog.tag'
+                )),
+            ],
+            options={
+                'unique_together': {('tag', 'article')},
+            },
+        ),
+        migrations.RunPython(backfill_article_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 10:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_articletag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleVisit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('count', models.IntegerField(default=0, verbose_name='访问数')),
+                ('article', models.ForeignKey(
+                    db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='blog.article'
+                )),
+            ],
+            options={
+                'unique_together': {('article', 'date')},
+            },
+        ),
+    ]
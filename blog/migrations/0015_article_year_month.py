@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:55
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_year_month(apps, schema_editor):
+    """按创建时间回填年月，每个月一条UPDATE"""
+    Article = apps.get_model('blog', 'Article')
+    months = {create_time.strftime('%Y-%m') for create_time in Article.objects.values_list('create_time', flat=True)}
+    for month in months:
+        start = datetime.strptime(month, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1)
+        Article.objects.filter(create_time__gte=start, create_time__lt=end).update(year_month=month)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_articlevisit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='year_month',
+            field=models.CharField(db_index=True, default='', max_length=7, verbose_name='年月'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='create_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='update_time',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'update_time'], name='blog_article_cate_update_idx'),
+        ),
+        migrations.RunPython(backfill_year_month, migrations.RunPython.noop),
+    ]
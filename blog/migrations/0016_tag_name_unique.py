@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """加唯一约束之前合并同名标签，保留id最小的，文章的标签id和关联表改为指向保留的标签"""
+    Tag = apps.get_model('blog', 'Tag')
+    Article = apps.get_model('blog', 'Article')
+    ArticleTag = apps.get_model('blog', 'ArticleTag')
+    # 超长的标签名截断，截断后同名的一起合并
+    for tag in Tag.objects.all():
+        if len(tag.name) > 64:
+            tag.name = tag.name[:64]
+            tag.save(update_fields=['name'])
+    kept: dict = {}
+    # 重复的标签id => 保留的标签id
+    replaced: dict = {}
+    for tag_id, name in Tag.objects.order_by('id').values_list('id', 'name'):
+        if name in kept:
+            replaced[tag_id] = kept[name]
+        else:
+            kept[name] = tag_id
+    if not replaced:
+        return
+    for article in Article.objects.filter(articletag__tag__in=replaced.keys()).distinct():
+        article.tags = list(dict.fromkeys(replaced.get(tag_id, tag_id) for tag_id in article.tags))
+        article.save(update_fields=['tags'])
+        ArticleTag.objects.filter(article=article, tag__in=replaced.keys()).delete()
+        existing = set(ArticleTag.objects.filter(article=article).values_list('tag', flat=True))
+        ArticleTag.objects.bulk_create([
+            ArticleTag(article=article, tag_id=tag_id) for tag_id in set(article.tags) - existing
+        ])
+    Tag.objects.filter(id__in=replaced.keys()).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_article_year_month'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=64, unique=True, verbose_name='标签名称'),
+        ),
+    ]
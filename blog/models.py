@@ -10,8 +10,42 @@ class Article(models.Model):
     category = models.ForeignKey('Category', null=True, on_delete=models.SET_NULL)
     # tags => [tag_id, tag_id, tag_id]
     tags = models.JSONField(default=list)
-    create_time = models.DateTimeField(auto_now_add=True)
-    update_time = models.DateTimeField(auto_now=True)
+    # 按月筛选时用半开区间走索引
+    create_time = models.DateTimeField(default=timezone.now, db_index=True)
+    # 列表按update_time排序，索引末尾隐含主键，游标分页的 (update_time, id) 也能走索引
+    update_time = models.DateTimeField(auto_now=True, db_index=True)
+    # 创建时间的年月 'YYYY-MM'，按月归档时直接按索引分组
+    year_month = models.CharField('年月', max_length=7, default='', db_index=True)
+
+    class Meta:
+        indexes = [
+            # 前台按分类筛选并按更新时间排序
+            models.Index(fields=['category', 'update_time'], name='blog_article_cate_update_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 创建时间不会修改，每次保存时同步年月
+        self.year_month = self.create_time.strftime('%Y-%m')
+        super().save(*args, **kwargs)
+
+
+class ArticleTag(models.Model):
+    """文章标签关联表，和Article.tags同步维护，按标签筛选时走索引"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, db_constraint=False)
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE, db_constraint=False)
+
+    class Meta:
+        unique_together = ('tag', 'article')
+
+
+class ArticleVisit(models.Model):
+    """文章每日访问数，由snapshot_visits命令从redis定时写入"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, db_constraint=False)
+    date = models.DateField('日期')
+    count = models.IntegerField('访问数', default=0)
+
+    class Meta:
+        unique_together = ('article', 'date')
 
 
 class Category(models.Model):
@@ -23,7 +57,8 @@ class Category(models.Model):
 
 class Tag(models.Model):
     """标签"""
-    name = models.TextField('标签名称')
+    # 唯一约束保证并发创建同名标签时不会重复
+    name = models.CharField('标签名称', max_length=64, unique=True)
 
 
 class Mood(models.Model):
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+import hashlib
+from typing import TYPE_CHECKING
+
+from markdown2 import Markdown
+from redis import RedisError
+from django.utils.html import strip_tags
+
+from blog import redis
+from blog.cache import LRUCache
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+
+class MarkdownRenderer:
+    """markdown渲染，按正文sha1缓存渲染结果
+
+    渲染结果 => {'html': str, 'excerpt': str, 'toc': str}
+    相同正文只渲染一次，保存文章和前台阅读共用同一份结果。
+    进程内LRU + redis两级，redis缓存设置过期时间，不再使用的正文自然淘汰。
+    """
+    # 摘要长度
+    excerpt_length: int = 180
+    # redis缓存过期时间，单位秒
+    timeout: int = 7 * 24 * 60 * 60
+
+    def __init__(self):
+        self.local = LRUCache(maxsize=64, ttl=10 * 60)
+
+    def render(self, md_body: str) -> dict[str, str]:
+        digest: str = hashlib.sha1(md_body.encode(encoding='utf-8')).hexdigest()
+        rendered: Optional[dict] = self.local.get(digest)
+        if rendered is not None:
+            return rendered
+
+        key: str = RedisKey.BLOG_MARKDOWN.format(digest)
+        try:
+            value: Optional[str] = redis.get(key)
+        except RedisError:
+            value = None
+        if value is not None:
+            rendered = json.loads(value)
+        else:
+            rendered = self.convert(md_body)
+            try:
+                redis.set(key, json.dumps(rendered), ex=self.timeout)
+            except RedisError:
+                pass
+        self.local.set(digest, rendered)
+        return rendered
+
+    def convert(self, md_body: str) -> dict[str, str]:
+        """md源文本转成html，生成目录，html去除标签和换行后生成摘要"""
+        md: Markdown = Markdown(extras=['toc'])
+        html = md.convert(md_body)
+        excerpt: str = strip_tags(html).replace('\n', ' ')
+        return {
+            'html': str(html),
+            'excerpt': excerpt[:self.excerpt_length],
+            'toc': html.toc_html or '',
+        }
+
+
+markdown_renderer = MarkdownRenderer()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import re
+import math
+import uuid
+import logging
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from redis import RedisError
+from django.db import connection
+from django.utils.html import escape, strip_tags
+
+from blog import redis
+from blog.breaker import redis_breaker
+from blog.models import Article
+from blog.render import markdown_renderer
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Iterable
+    from django.db.models import QuerySet
+
+# 连续的中日韩文字，或连续的英文数字
+TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+')
+CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+
+logger = logging.getLogger('blog')
+
+
+class SearchIndex:
+    """文章全文搜索，倒排索引存放在redis
+
+    分词：中文按二元组（bigram）切分，索引时每个字也单独成词，单字查询也能命中；英文数字按单词切分，统一小写
+    每个词一个sorted set，article_id => 词在文章中的权重，标题、摘要、正文的权重不同；
+    每篇文章记录自己的词集合，修改和删除时用来清理旧索引。
+    查询时对所有词求交集，按 tf * idf 排序。
+    索引未就绪时由一个进程在后台线程中重建，重建期间和redis不可用时只在最近更新的文章的标题和摘要中查找。
+    """
+    # 各字段的权重
+    field_weights: dict[str, float] = {'title': 5, 'excerpt': 2, 'body': 1}
+    # 摘录前后保留的字数
+    snippet_radius: int = 40
+    # 重建锁的过期时间，单位秒，持锁进程异常退出时最多这么久之后其他进程可以重建
+    lock_timeout: int = 10 * 60
+    # 没有索引时查找的文章数，按更新时间倒序走索引取出，不扫描正文，每次搜索的代价有上限
+    fallback_scan_limit: int = 500
+
+    def tokenize(self, text: str, query: bool = False) -> list[str]:
+        """分词，query为True时是查询分词，多字的中文只切分二元组，不需要再匹配单字"""
+        tokens: list[str] = []
+        for segment in TOKEN_PATTERN.findall(text.lower()):
+            if not CJK_PATTERN.match(segment) or len(segment) == 1:
+                tokens.append(segment)
+                continue
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+            if not query:
+                tokens.extend(segment)
+        return tokens
+
+    def plain_text(self, md_body: str) -> str:
+        """markdown正文转为纯文本，复用渲染缓存"""
+        return strip_tags(markdown_renderer.render(md_body)['html'])
+
+    def weigh(self, article: Article) -> dict[str, float]:
+        """计算文章中每个词的权重，词频取对数，避免长文章中的高频词权重过大"""
+        texts: dict[str, str] = {
+            'title': article.title,
+            'excerpt': article.excerpt,
+            'body': self.plain_text(article.body),
+        }
+        weights: Counter = Counter()
+        for field, text in texts.items():
+            for token, count in Counter(self.tokenize(text)).items():
+                weights[token] += self.field_weights[field] * (1 + math.log(count))
+        return dict(weights)
+
+    def index(self, article: Article) -> None:
+        """新增或更新文章索引"""
+        weights: dict[str, float] = self.weigh(article)
+        doc_key: str = RedisKey.BLOG_SEARCH_DOC.format(article.id)
+        try:
+            old_tokens: set[str] = redis.smembers(doc_key)
+            pipe = redis.pipeline(transaction=True)
+            for token in old_tokens - weights.keys():
+                pipe.zrem(RedisKey.BLOG_SEARCH_TERM.format(token), article.id)
+            for token, weight in weights.items():
+                pipe.zadd(RedisKey.BLOG_SEARCH_TERM.format(token), {article.id: weight})
+            pipe.delete(doc_key)
+            if weights:
+                pipe.sadd(doc_key, *weights.keys())
+            pipe.sadd(RedisKey.BLOG_SEARCH_DOCS, article.id)
+            pipe.execute()
+        except RedisError:
+            self.invalidate()
+
+    def remove(self, article_id: int) -> None:
+        doc_key: str = RedisKey.BLOG_SEARCH_DOC.format(article_id)
+        try:
+            tokens: set[str] = redis.smembers(doc_key)
+            pipe = redis.pipeline(transaction=True)
+            for token in tokens:
+                pipe.zrem(RedisKey.BLOG_SEARCH_TERM.format(token), article_id)
+            pipe.delete(doc_key)
+            pipe.srem(RedisKey.BLOG_SEARCH_DOCS, article_id)
+            pipe.execute()
+        except RedisError:
+            self.invalidate()
+
+    def start_rebuild(self) -> None:
+        """拿到重建锁时在后台线程中重建，已经有进程在重建时直接返回"""
+        # 锁在请求线程获取、在重建线程释放，token不能存在线程本地
+        lock = redis.lock(RedisKey.BLOG_SEARCH_LOCK, timeout=self.lock_timeout, thread_local=False)
+        if lock.acquire(blocking=False):
+            threading.Thread(target=self.rebuild_in_background, args=(lock,), daemon=True).start()
+
+    def rebuild_in_background(self, lock) -> None:
+        try:
+            self.rebuild(locked=True)
+        except Exception:
+            logger.exception('重建搜索索引失败')
+        finally:
+            # 线程中打开的数据库连接不会随请求结束关闭
+            connection.close()
+            try:
+                lock.release()
+            except RedisError:
+                pass
+
+    def rebuild(self, locked: bool = False) -> int:
+        """清空并重建全部索引，返回索引的文章数
+
+        Args:
+            locked: 调用方已经持有重建锁，否则先等待重建锁，避免和其他进程的重建交错，留下不完整的索引
+        """
+        if not locked:
+            with redis.lock(RedisKey.BLOG_SEARCH_LOCK, timeout=self.lock_timeout):
+                return self.rebuild(locked=True)
+        self.clear()
+        count: int = 0
+        articles: QuerySet[Article] = Article.objects.only('id', 'title', 'excerpt', 'body')
+        for article in articles.iterator():
+            self.index(article)
+            count += 1
+        redis.set(RedisKey.BLOG_SEARCH_READY, 1)
+        return count
+
+    def clear(self) -> None:
+        redis.delete(RedisKey.BLOG_SEARCH_READY)
+        for article_id in redis.smembers(RedisKey.BLOG_SEARCH_DOCS):
+            self.remove(article_id)
+        redis.delete(RedisKey.BLOG_SEARCH_DOCS)
+
+    def invalidate(self) -> None:
+        """索引更新失败时标记失效，下次搜索时重建"""
+        try:
+            redis.delete(RedisKey.BLOG_SEARCH_READY)
+        except RedisError:
+            # redis恢复后再标记，否则恢复后会一直用缺少这次修改的索引
+            redis_breaker.defer('search_index.invalidate', self.invalidate)
+
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> tuple[int, list[dict]]:
+        """返回命中总数和当前页结果"""
+        tokens: list[str] = list(dict.fromkeys(self.tokenize(query, query=True)))
+        if not tokens:
+            return 0, []
+        try:
+            return self.search_index(query, tokens, offset, limit)
+        except RedisError:
+            return self.search_from_db(query, offset, limit)
+
+    def search_index(self, query: str, tokens: list[str], offset: int, limit: int) -> tuple[int, list[dict]]:
+        if not redis.exists(RedisKey.BLOG_SEARCH_READY):
+            self.start_rebuild()
+            return self.search_from_db(query, offset, limit)
+
+        term_keys: list[str] = [RedisKey.BLOG_SEARCH_TERM.format(token) for token in tokens]
+        pipe = redis.pipeline(transaction=False)
+        pipe.scard(RedisKey.BLOG_SEARCH_DOCS)
+        for key in term_keys:
+            pipe.zcard(key)
+        total_docs, *doc_freqs = pipe.execute()
+        # 有词没有出现在任何文章中，交集必然为空
+        if not all(doc_freqs):
+            return 0, []
+        # 按idf加权求交集，结果放在临时key中
+        weights: dict[str, float] = {
+            key: math.log(1 + total_docs / doc_freq) for key, doc_freq in zip(term_keys, doc_freqs)
+        }
+        result_key: str = RedisKey.BLOG_SEARCH_RESULT.format(uuid.uuid4().hex)
+        pipe = redis.pipeline(transaction=True)
+        pipe.zinterstore(result_key, weights)
+        pipe.zrevrange(result_key, offset, offset + limit - 1, withscores=True)
+        pipe.delete(result_key)
+        total, hits, _ = pipe.execute()
+        if not hits:
+            return total, []
+        return total, self.make_records(query, [(int(article_id), score) for article_id, score in hits])
+
+    def search_from_db(self, query: str, offset: int, limit: int) -> tuple[int, list[dict]]:
+        """
+        没有索引时的降级搜索，每个词都要出现在标题或摘要中，按更新时间排序，没有相关度
+        只查找最近更新的fallback_scan_limit篇文章，不用LIKE扫描全表和正文，避免redis不可用时每次搜索都全表扫描
+        """
+        segments: list[str] = TOKEN_PATTERN.findall(query.lower())
+        recent: QuerySet[dict] = Article.objects.order_by('-update_time', '-id').values('id', 'title', 'excerpt')
+        article_ids: list[int] = [
+            article['id'] for article in recent[:self.fallback_scan_limit]
+            if all(segment in '{0}\n{1}'.format(article['title'], article['excerpt']).lower() for segment in segments)
+        ]
+        hits: list[tuple[int, float]] = [(article_id, 0) for article_id in article_ids[offset:offset + limit]]
+        return len(article_ids), self.make_records(query, hits)
+
+    def make_records(self, query: str, hits: list[tuple[int, float]]) -> list[dict]:
+        """按命中顺序返回文章标题和摘录，标题和摘录中的命中词高亮"""
+        article_ids: list[int] = [article_id for article_id, _ in hits]
+        articles: dict[int, Article] = Article.objects.only('id', 'title', 'excerpt', 'body').in_bulk(article_ids)
+        segments: list[str] = TOKEN_PATTERN.findall(query.lower())
+        records: list[dict] = []
+        for article_id, score in hits:
+            article: Article = articles.get(article_id)
+            if article is None:
+                continue
+            records.append({
+                'id': article.id,
+                'title': self.highlight(article.title, segments),
+                'snippet': self.snippet(self.plain_text(article.body) or article.excerpt, segments),
+                'score': round(score, 3),
+            })
+        return records
+
+    def snippet(self, text: str, segments: Iterable[str]) -> str:
+        """截取第一个命中词附近的文本并高亮"""
+        text = ' '.join(text.split())
+        lower_text: str = text.lower()
+        positions: list[int] = [lower_text.find(segment) for segment in segments]
+        positions = [position for position in positions if position >= 0]
+        position: int = min(positions) if positions else 0
+        start: int = max(position - self.snippet_radius, 0)
+        end: int = position + self.snippet_radius * 2
+        snippet: str = self.highlight(text[start:end], segments)
+        prefix: str = '...' if start > 0 else ''
+        suffix: str = '...' if end < len(text) else ''
+        return prefix + snippet + suffix
+
+    def highlight(self, text: str, segments: Iterable[str]) -> str:
+        """转义html后用<em>包裹命中的词"""
+        segments = [re.escape(escape(segment)) for segment in segments if segment]
+        text = escape(text)
+        if not segments:
+            return text
+        pattern = re.compile('|'.join(sorted(segments, key=len, reverse=True)), re.IGNORECASE)
+        return pattern.sub(lambda match: '<em>{0}</em>'.format(match.group(0)), text)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if TYPE_CHECKING:
+    from typing import Any, Iterable, Iterator, Optional
+
+
+def format_datetime(value: datetime) -> str:
+    """时间去掉毫秒转为str，e.g. 2021-05-22 10:00:00，和format_datetime_to_str的格式一致"""
+    return str(value.replace(microsecond=0))
+
+
+class BlogJSONEncoder(DjangoJSONEncoder):
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime):
+            return format_datetime(o)
+        return super().default(o)
+
+
+class JSONSerializer:
+    """标准库json序列化，datetime直接输出为接口约定的格式，不需要先逐行转换"""
+    # 流式输出时每批序列化的行数
+    batch_size: int = 200
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, cls=BlogJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def iter_response(
+            self, rows: Iterable[dict], data: Optional[dict] = None, msg: str = 'ok', code: int = 0
+    ) -> Iterator[bytes]:
+        """
+        流式生成 {"ret": code, "msg": msg, "data": [...rows]}，
+        传入data时生成 {"ret": code, "msg": msg, "data": {**data, "lists": [...rows]}}
+        rows逐批序列化，内存占用只和batch_size有关，和总行数无关
+        """
+        if data is None:
+            head: dict = {'ret': code, 'msg': msg, 'data': []}
+            tail: bytes = b']}'
+        else:
+            head: dict = {'ret': code, 'msg': msg, 'data': {**data, 'lists': []}}
+            tail: bytes = b']}}'
+        # 去掉结尾的括号，从列表的左括号之后开始拼接行
+        yield self.dumps(head)[:-len(tail)]
+        iterator: Iterator[dict] = iter(rows)
+        separator: bytes = b''
+        while batch := list(islice(iterator, self.batch_size)):
+            yield separator + b','.join(self.dumps(row) for row in batch)
+            separator = b','
+        yield tail
+
+
+class OrjsonSerializer(JSONSerializer):
+    """orjson序列化，datetime交给default按接口格式输出"""
+    # 和标准库一样允许int等非str的key，e.g. 标签映射 {id: name}
+    option: int = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data, default=self.default, option=self.option)
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime):
+            return format_datetime(o)
+        return DjangoJSONEncoder().default(o)
+
+
+# 安装了orjson时优先使用
+json_serializer: JSONSerializer = OrjsonSerializer() if orjson is not None else JSONSerializer()
@@ -22,3 +22,66 @@ def get_qualified_key_mapping(authority_conf: list[dict]) -> dict:
 class RedisKey:
     """redis key 常量类"""
     BLOG_ARTICLE_VISIT = 'blog:article:visit'
+    # 文章按天的访问增量，{0} => 'YYYY-mm-dd'，写入db后删除
+    BLOG_ARTICLE_VISIT_DAY = 'blog:article:visit:day:{0}'
+    # 还没写入db的日期集合
+    BLOG_ARTICLE_VISIT_DAYS = 'blog:article:visit:days'
+    # 总访问数是否完整，不存在时从db恢复
+    BLOG_ARTICLE_VISIT_READY = 'blog:article:visit:ready'
+    # 热门文章总排行，article_id => 总访问数
+    BLOG_ARTICLE_HOT = 'blog:article:hot'
+    # 热门文章按天排行，{0} => 'YYYY-mm-dd'，article_id => 当天访问数
+    BLOG_ARTICLE_HOT_DAY = 'blog:article:hot:day:{0}'
+    # 最近N天排行，{0} => 天数
+    BLOG_ARTICLE_HOT_WINDOW = 'blog:article:hot:window:{0}'
+    # 最近N天排行最后一次合并的日期，不是今天时读取会重新合并
+    BLOG_ARTICLE_HOT_WINDOW_DAY = 'blog:article:hot:window:day'
+    # 排行是否完整，不存在时读取会触发重建
+    BLOG_ARTICLE_HOT_READY = 'blog:article:hot:ready'
+    # 文章独立访客HyperLogLog，{0} => article_id
+    BLOG_ARTICLE_UNIQUE_VISIT = 'blog:article:unique_visit:{0}'
+    # 前台响应缓存版本号，后台写操作时递增
+    BLOG_CACHE_VERSION = 'blog:cache:version'
+    # ETag纪元，不存在时生成随机值，redis被清空或切换到丢失数据的实例后版本号从头计数，纪元也会变，旧ETag不会误命中
+    BLOG_ETAG_EPOCH = 'blog:etag:epoch'
+    # 前台响应缓存，{0} => path + query string 的md5
+    BLOG_CACHE_RESPONSE = 'blog:cache:response:{0}'
+    # 前台响应缓存的重建锁，{0} => 响应缓存的key
+    BLOG_CACHE_LOCK = 'blog:cache:lock:{0}'
+    # 用户状态和权限key缓存，{0} => user id
+    BLOG_USER_PERMISSION = 'blog:user:permission:{0}'
+    # 还没写入db的用户登录时间，user_id => 'YYYY-mm-dd HH:MM:SS.ffffff'
+    BLOG_USER_LAST_LOGIN = 'blog:user:last_login'
+    # 文章归档统计，category_id | tag_id | 'YYYY-MM' => count
+    BLOG_ARCHIVE_CATEGORY = 'blog:archive:category'
+    BLOG_ARCHIVE_TAG = 'blog:archive:tag'
+    BLOG_ARCHIVE_MONTH = 'blog:archive:month'
+    # 归档统计是否完整，不存在时读取会触发重建
+    BLOG_ARCHIVE_READY = 'blog:archive:ready'
+    # markdown渲染结果，{0} => 正文sha1
+    BLOG_MARKDOWN = 'blog:markdown:{0}'
+    # 标签版本号，创建标签时递增
+    BLOG_TAG_VERSION = 'blog:tag:version'
+    # 标签映射 tag_id => name，以及映射对应的版本号
+    BLOG_TAG_MAP = 'blog:tag:map'
+    BLOG_TAG_MAP_VERSION = 'blog:tag:map:version'
+    # 创建标签的锁
+    BLOG_TAG_LOCK = 'blog:tag:lock'
+    # 接口性能数据，{0} => qualified_name，field => 累加值
+    BLOG_METRICS = 'blog:metrics:{0}'
+    # 有性能数据的qualified_name集合
+    BLOG_METRICS_NAMES = 'blog:metrics:names'
+    # 搜索倒排索引，{0} => 词，article_id => 权重
+    BLOG_SEARCH_TERM = 'blog:search:term:{0}'
+    # 文章包含的词，{0} => article_id
+    BLOG_SEARCH_DOC = 'blog:search:doc:{0}'
+    # 已索引的文章id
+    BLOG_SEARCH_DOCS = 'blog:search:docs'
+    # 搜索结果临时key，{0} => 随机串
+    BLOG_SEARCH_RESULT = 'blog:search:result:{0}'
+    # 索引是否完整，不存在时搜索会触发重建
+    BLOG_SEARCH_READY = 'blog:search:ready'
+    # 重建搜索索引的锁，同时只有一个进程重建
+    BLOG_SEARCH_LOCK = 'blog:search:lock'
+    # 最近有写操作，存在时读请求都走主库
+    BLOG_DB_PRIMARY_PIN = 'blog:db:primary_pin'
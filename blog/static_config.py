@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+from blog.services import get_qualified_key_mapping
+
+if TYPE_CHECKING:
+    from typing import Any
+
+logger = logging.getLogger('blog')
+
+# 配置文件所在目录，不依赖启动时的工作目录
+CONFIG_DIR: str = os.path.dirname(os.path.abspath(__file__))
+
+
+class ConfigSnapshot:
+    """某个版本的配置文件内容，加载后不再修改，整体替换保证读取时内容一致"""
+
+    def __init__(self, version: str, data: Any, data_json: str, derived: Any = None):
+        # 文件修改时间和大小，文件变化后版本号变化
+        self.version: str = version
+        self.data: Any = data
+        # 序列化好的json，直接作为响应data
+        self.data_json: str = data_json
+        # 由data计算出的附加数据，见StaticConfig.derive
+        self.derived: Any = derived
+
+
+class StaticConfig:
+    """进程内的json配置文件，按修改时间热更新
+
+    每隔check_interval秒stat一次文件，修改时间或大小变化时重新加载，
+    每个worker各自检测，改完文件后所有worker最多延迟check_interval秒生效，不需要重启。
+    新文件解析失败时继续使用旧内容，下次检测再重试。
+    """
+    # 检测文件变化的间隔，单位秒
+    check_interval: float = 1
+
+    def __init__(self, filename: str):
+        self.path: str = os.path.join(CONFIG_DIR, filename)
+        self._lock = threading.Lock()
+        self._checked_at: float = time.monotonic()
+        self._snapshot: ConfigSnapshot = self.load(self.stat())
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        self.refresh()
+        return self._snapshot
+
+    @property
+    def data(self) -> Any:
+        """解析后的配置，调用方不能修改"""
+        return self.snapshot.data
+
+    @property
+    def data_json(self) -> str:
+        return self.snapshot.data_json
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def stat(self) -> str:
+        stat: os.stat_result = os.stat(self.path)
+        return '{0}-{1}'.format(stat.st_mtime_ns, stat.st_size)
+
+    def load(self, version: str) -> ConfigSnapshot:
+        with open(self.path, 'rb') as file:
+            data: Any = json.load(file)
+        return ConfigSnapshot(version, data, json.dumps(data, ensure_ascii=False), self.derive(data))
+
+    def derive(self, data: Any) -> Any:
+        """子类重写，加载时由配置计算附加数据，和配置一起替换"""
+        return None
+
+    def refresh(self, force: bool = False) -> None:
+        now: float = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        # 其他线程正在检测时直接使用当前内容
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            self._checked_at = now
+            version: str = self.stat()
+            if version == self._snapshot.version:
+                return
+            self._snapshot = self.load(version)
+            logger.info('配置文件%s已重新加载', self.path)
+        except (OSError, ValueError):
+            logger.exception('配置文件%s加载失败，继续使用旧配置', self.path)
+        finally:
+            self._lock.release()
+
+
+class AuthorityConfig(StaticConfig):
+    """权限配置，额外维护 qualified_name => 权限key 的映射"""
+
+    def derive(self, data: list[dict]) -> dict:
+        return get_qualified_key_mapping(data)
+
+    @property
+    def qualified_key_mapping(self) -> dict:
+        return self.snapshot.derived
+
+
+# 权限树和侧边栏菜单
+authority_config = AuthorityConfig('Authority.json')
+# 更新记录
+records_config = StaticConfig('Records.json')
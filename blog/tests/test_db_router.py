@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from blog import redis
+from blog.db_router import ReplicaChoice, ReplicaRouter, current_replica, replica_selector
+from blog.models import Article, Mood, User
+from blog.services import RedisKey
+from blog.views.base_view import BaseView, TokenMixin
+
+
+@skipUnless(settings.DATABASE_REPLICAS == ['replica0'], '需要使用压测配置运行：BLOG_ENV_FILE=blog_backend/env.bench.json')
+class ReplicaTestCase(TransactionTestCase):
+    """使用压测配置运行，bench_replica.sqlite3作为只读库，测试时是主库的镜像
+
+    BLOG_ENV_FILE=blog_backend/env.bench.json python manage.py test blog
+    镜像是另一个连接，看不到主库未提交的事务，所以用TransactionTestCase
+    """
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        redis.delete(RedisKey.BLOG_DB_PRIMARY_PIN)
+        replica_selector._status.clear()
+        replica_selector._pinned_until = 0
+        Article.objects.create(title='t', body='b')
+
+    def read_alias(self) -> str:
+        """在只读库选择下执行一次读查询，返回执行查询的库"""
+        token = current_replica.set(ReplicaChoice())
+        try:
+            with CaptureQueriesContext(connections['replica0']) as replica_queries:
+                list(Article.objects.values('id'))
+        finally:
+            current_replica.reset(token)
+        return 'replica0' if replica_queries.captured_queries else 'default'
+
+
+class ReplicaRouterTests(ReplicaTestCase):
+
+    def test_read_uses_replica(self):
+        self.assertEqual(self.read_alias(), 'replica0')
+
+    def test_read_without_choice_uses_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Article))
+
+    def test_write_always_uses_primary(self):
+        token = current_replica.set(ReplicaChoice())
+        try:
+            self.assertEqual(ReplicaRouter().db_for_write(Article), 'default')
+        finally:
+            current_replica.reset(token)
+
+    def test_pin_sends_reads_to_primary(self):
+        replica_selector.pin()
+        self.assertEqual(self.read_alias(), 'default')
+
+    def test_pin_from_other_process(self):
+        # 其他进程写入的标记只在redis里
+        redis.set(RedisKey.BLOG_DB_PRIMARY_PIN, 1, ex=settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self.read_alias(), 'default')
+
+    def test_write_request_pins(self):
+        admin: User = User.objects.create(username='admin', password='x', is_admin=True)
+        token: str = TokenMixin().encode_token({'id': admin.id, 'username': admin.username})
+        response = self.client.post(
+            '/back/blog/mood', {'content': 'm'}, content_type='application/json', HTTP_AUTHORIZATION='Bearer ' + token
+        )
+        self.assertEqual(response.json()['ret'], 0)
+        self.assertTrue(Mood.objects.exists())
+        replica_selector._pinned_until = 0
+        self.assertTrue(redis.exists(RedisKey.BLOG_DB_PRIMARY_PIN))
+        self.assertEqual(self.read_alias(), 'default')
+
+    def test_lagging_replica_skipped(self):
+        with mock.patch.object(replica_selector, 'get_lag', return_value=settings.REPLICA_MAX_LAG + 1):
+            self.assertEqual(self.read_alias(), 'default')
+
+    def test_broken_replication_skipped(self):
+        with mock.patch.object(replica_selector, 'get_lag', return_value=None):
+            self.assertEqual(self.read_alias(), 'default')
+
+    def test_unreachable_replica_skipped(self):
+        with mock.patch.object(replica_selector, 'get_lag', side_effect=DatabaseError('down')):
+            self.assertEqual(self.read_alias(), 'default')
+
+    def test_status_checked_once_per_interval(self):
+        with mock.patch.object(replica_selector, 'get_lag', return_value=0) as get_lag:
+            self.read_alias()
+            self.read_alias()
+        self.assertEqual(get_lag.call_count, 1)
+
+    def test_no_replicas_configured(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.read_alias(), 'default')
+
+
+# ReplicaView每次执行时读查询使用的库
+aliases: list = []
+
+
+class ReplicaView(BaseView):
+    """在只读库上执行时模拟只读库连接断开"""
+    read_replica = True
+
+    def get(self, request):
+        aliases.append(ReplicaRouter().db_for_read(Article))
+        if aliases[-1] == 'replica0':
+            raise OperationalError('replica gone')
+        return self.success(len(Article.objects.values('id')))
+
+
+class CallHandlerTests(ReplicaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        aliases.clear()
+
+    def test_replica_error_retried_on_primary(self):
+        view = ReplicaView()
+        request = RequestFactory().get('/front/replica')
+        with self.assertLogs('blog', 'WARNING'):
+            response = view._call_handler(request, view.get)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(aliases, ['replica0', None])
+        # 失败的只读库在检查间隔内不再使用
+        self.assertEqual(self.read_alias(), 'default')
+
+    def test_primary_error_not_retried(self):
+        view = ReplicaView()
+        request = RequestFactory().get('/front/replica')
+        replica_selector.pin()
+        with mock.patch.object(Article.objects, 'values', side_effect=OperationalError('primary gone')):
+            with self.assertRaises(OperationalError):
+                view._call_handler(request, view.get)
+        self.assertEqual(aliases, [None])
+
+    def test_back_request_uses_primary(self):
+        view = ReplicaView()
+        request = RequestFactory().get('/back/replica')
+        view._call_handler(request, view.get)
+        self.assertEqual(aliases, [None])
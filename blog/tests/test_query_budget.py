@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from django.test import RequestFactory, TestCase, override_settings
+
+from blog.cache import response_cache
+from blog.models import Article, Category
+from blog.views.base_view import BaseView, QueryBudgetExceeded
+
+
+class NPlusOneView(BaseView):
+    """逐篇文章查分类，每篇文章一条sql"""
+    query_budgets = {'get': 10}
+
+    def get(self, request):
+        return self.success([article.category.name for article in Article.objects.all()])
+
+
+class PreloadView(BaseView):
+    """同NPlusOneView，分类一起join查出"""
+    query_budgets = {'get': 1}
+
+    def get(self, request):
+        return self.success([article.category.name for article in Article.objects.select_related('category')])
+
+
+# 预算测试不涉及只读库，读都走主库
+@override_settings(DATABASE_REPLICAS=[])
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        category: Category = Category.objects.create(name='c')
+        for index in range(5):
+            Article.objects.create(title='t{0}'.format(index), body='b', category=category)
+
+    def call(self, view_class: type[BaseView]):
+        return view_class.as_view()(RequestFactory().get('/front/budget'))
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_n_plus_one_fails_in_strict_mode(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '疑似N+1'):
+            self.call(NPlusOneView)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_over_budget_fails_in_strict_mode(self):
+        NPlusOneView.query_budgets = {'get': 3}
+        try:
+            with self.assertRaisesMessage(QueryBudgetExceeded, '超出预算3条'):
+                self.call(NPlusOneView)
+        finally:
+            NPlusOneView.query_budgets = {'get': 10}
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_n_plus_one_only_logged_by_default(self):
+        with self.assertLogs('blog', 'WARNING') as logs:
+            response = self.call(NPlusOneView)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('疑似N+1', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_within_budget(self):
+        self.assertEqual(self.call(PreloadView).status_code, 200)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_articles_view_within_budget(self):
+        # 递增版本号，让响应缓存失效，文章列表需要查库
+        response_cache.bump()
+        response = self.client.get('/front/articles')
+        self.assertEqual(response.json()['ret'], 0)
+        self.assertEqual(len(response.json()['data']['lists']), 5)
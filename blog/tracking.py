@@ -0,0 +1,581 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, date, timedelta
+from typing import TYPE_CHECKING
+
+from redis import RedisError, WatchError
+from django.db import transaction
+from django.db.models import Sum
+
+from blog import redis
+from blog.breaker import redis_breaker
+from blog.cache import LRUCache
+from blog.metrics import RequestMetrics
+from blog.models import User, Article, ArticleVisit
+from blog.services import RedisKey
+
+if TYPE_CHECKING:
+    from typing import Optional
+    from django.db.models import QuerySet
+
+logger = logging.getLogger('blog.metrics')
+
+
+class LastLoginBuffer:
+    """用户最近登录时间写缓冲
+
+    鉴权时只把 user_id => 登录时间 写入redis hash，
+    由 flush_last_login 命令定时取出，用一条批量UPDATE写回db。
+    """
+
+    def touch(self, user_id: int, now: Optional[datetime] = None) -> None:
+        """记录用户登录时间，redis不可用时直接写db"""
+        now = now or datetime.now()
+        try:
+            redis.hset(RedisKey.BLOG_USER_LAST_LOGIN, user_id, now.isoformat(sep=' '))
+        except RedisError:
+            User.objects.filter(id=user_id).update(last_login=now)
+
+    def get_all(self) -> dict[int, datetime]:
+        """获取还没写入db的登录时间"""
+        try:
+            records: dict[str, str] = redis.hgetall(RedisKey.BLOG_USER_LAST_LOGIN)
+        except RedisError:
+            return {}
+        return {int(user_id): datetime.fromisoformat(value) for user_id, value in records.items()}
+
+    def flush(self) -> int:
+        """批量写回db，写入成功后再从缓冲中删除，返回写入条数
+
+        写db失败时缓冲原样保留，下次重试；写回是覆盖，重复写入没有影响。
+        """
+        records: dict[str, str] = redis.hgetall(RedisKey.BLOG_USER_LAST_LOGIN)
+        if not records:
+            return 0
+        users: list[User] = [
+            User(id=int(user_id), last_login=datetime.fromisoformat(value))
+            for user_id, value in records.items()
+        ]
+        User.objects.bulk_update(users, ['last_login'])
+        self.remove_written(records)
+        return len(users)
+
+    def remove_written(self, records: dict[str, str], attempts: int = 3) -> None:
+        """删除已经写入db的登录时间，期间又登录了的用户时间已经变化，保留到下次写入"""
+        key: str = RedisKey.BLOG_USER_LAST_LOGIN
+        user_ids: list[str] = list(records)
+        for _ in range(attempts):
+            with redis.pipeline(transaction=True) as pipe:
+                pipe.watch(key)
+                values: list[Optional[str]] = pipe.hmget(key, user_ids)
+                written: list[str] = [
+                    user_id for user_id, value in zip(user_ids, values) if value == records[user_id]
+                ]
+                pipe.multi()
+                if written:
+                    pipe.hdel(key, *written)
+                try:
+                    pipe.execute()
+                except WatchError:
+                    continue
+            return
+
+
+class HotRanking:
+    """热门文章排行和独立访客统计
+
+    排行是redis有序集合，在VisitCounter.flush中和访问数一起更新，每篇文章每个集合一次ZINCRBY，O(log n)：
+    总排行 article_id => 总访问数，和访问数hash一致；
+    按天排行 article_id => 当天访问数，保留最大窗口的天数；
+    最近N天排行 每天第一次读取时从按天排行重新合并，之后随访问增量更新，读取前k名只需要O(log n + k)。
+    独立访客按文章用HyperLogLog估算，标准误差0.81%，每篇文章最多占用12KB。
+    READY标记不存在时（首次部署、redis被清空）读取会触发重建：总排行从访问数hash恢复，
+    按天排行从ArticleVisit表和还没写入db的按天增量恢复；独立访客没有历史数据，从零开始统计。
+    """
+    # 支持的最近N天排行
+    windows: tuple[int, ...] = (7, 30)
+
+    @property
+    def day_ttl(self) -> int:
+        # 按天排行多保留一天，跨天时最近N天排行重新合并还需要用到
+        return (max(self.windows) + 1) * 24 * 60 * 60
+
+    def day_key(self, day: date) -> str:
+        return RedisKey.BLOG_ARTICLE_HOT_DAY.format(day.isoformat())
+
+    def record(self, pipe, day: date, counts: Counter, visitors: dict[int, set[str]]) -> None:
+        """在VisitCounter.flush的pipeline中追加排行和独立访客的更新"""
+        day_key: str = self.day_key(day)
+        for article_id, count in counts.items():
+            pipe.zincrby(RedisKey.BLOG_ARTICLE_HOT, count, article_id)
+            pipe.zincrby(day_key, count, article_id)
+            for days in self.windows:
+                pipe.zincrby(RedisKey.BLOG_ARTICLE_HOT_WINDOW.format(days), count, article_id)
+        pipe.expire(day_key, self.day_ttl)
+        for article_id, ids in visitors.items():
+            pipe.pfadd(RedisKey.BLOG_ARTICLE_UNIQUE_VISIT.format(article_id), *ids)
+
+    def get_top(self, days: int = 0, limit: int = 10) -> list[tuple[int, int]]:
+        """访问数最多的limit篇文章 [(article_id, 访问数)]，days为0时是总排行，否则是最近days天的排行"""
+        if days and days not in self.windows:
+            raise ValueError('只支持最近{0}天的排行'.format('、'.join(str(days) for days in self.windows)))
+        key: str = RedisKey.BLOG_ARTICLE_HOT_WINDOW.format(days) if days else RedisKey.BLOG_ARTICLE_HOT
+        today: date = date.today()
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.exists(RedisKey.BLOG_ARTICLE_HOT_READY)
+            pipe.get(RedisKey.BLOG_ARTICLE_HOT_WINDOW_DAY)
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            ready, window_day, records = pipe.execute()
+            if not ready:
+                self.rebuild(today)
+                records = redis.zrevrange(key, 0, limit - 1, withscores=True)
+            elif days and window_day != today.isoformat():
+                self.roll(today)
+                records = redis.zrevrange(key, 0, limit - 1, withscores=True)
+        except RedisError:
+            return self.get_top_from_db(days, limit)
+        return [(int(article_id), int(score)) for article_id, score in records if score > 0]
+
+    def get_top_from_db(self, days: int, limit: int) -> list[tuple[int, int]]:
+        """redis不可用时从db汇总，只包含已经写入db的访问数"""
+        records: QuerySet[ArticleVisit] = ArticleVisit.objects.all()
+        if days:
+            records = records.filter(date__gt=date.today() - timedelta(days=days))
+        records = records.values('article').annotate(total=Sum('count')).order_by('-total', 'article')[:limit]
+        return [(record['article'], record['total']) for record in records]
+
+    def get_unique_counts(self, article_ids: list[int]) -> list[int]:
+        """批量获取独立访客数，redis不可用时返回0"""
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for article_id in article_ids:
+                pipe.pfcount(RedisKey.BLOG_ARTICLE_UNIQUE_VISIT.format(article_id))
+            return pipe.execute()
+        except RedisError:
+            return [0] * len(article_ids)
+
+    def roll(self, today: date) -> None:
+        """从按天排行重新合并最近N天排行，每天第一次读取时执行，多个进程同时执行结果相同"""
+        pipe = redis.pipeline(transaction=True)
+        for days in self.windows:
+            day_keys: list[str] = [self.day_key(today - timedelta(days=offset)) for offset in range(days)]
+            pipe.zunionstore(RedisKey.BLOG_ARTICLE_HOT_WINDOW.format(days), day_keys)
+        pipe.set(RedisKey.BLOG_ARTICLE_HOT_WINDOW_DAY, today.isoformat())
+        pipe.execute()
+
+    def rebuild(self, today: date) -> None:
+        """从访问数hash、ArticleVisit表和redis中的按天增量重建排行"""
+        start: date = today - timedelta(days=max(self.windows))
+        day_counts: defaultdict[date, Counter] = defaultdict(Counter)
+        records: QuerySet[tuple] = ArticleVisit.objects.filter(date__gt=start).values_list('article', 'date', 'count')
+        for article_id, day, count in records:
+            day_counts[day][article_id] += count
+        # 还没写入db的按天增量
+        for day in redis.smembers(RedisKey.BLOG_ARTICLE_VISIT_DAYS):
+            if date.fromisoformat(day) > start:
+                for article_id, count in redis.hgetall(RedisKey.BLOG_ARTICLE_VISIT_DAY.format(day)).items():
+                    day_counts[date.fromisoformat(day)][int(article_id)] += int(count)
+        totals: dict[str, str] = redis.hgetall(RedisKey.BLOG_ARTICLE_VISIT)
+
+        pipe = redis.pipeline(transaction=True)
+        pipe.delete(RedisKey.BLOG_ARTICLE_HOT, *[self.day_key(today - timedelta(days=offset))
+                                                 for offset in range(max(self.windows) + 1)])
+        if totals:
+            pipe.zadd(RedisKey.BLOG_ARTICLE_HOT, {article_id: int(total) for article_id, total in totals.items()})
+        for day, counts in day_counts.items():
+            pipe.zadd(self.day_key(day), dict(counts))
+            pipe.expire(self.day_key(day), self.day_ttl)
+        pipe.set(RedisKey.BLOG_ARTICLE_HOT_READY, 1)
+        pipe.execute()
+        self.roll(today)
+
+    def remove(self, article_id: int) -> None:
+        """删除文章时清理排行和独立访客"""
+        today: date = date.today()
+        pipe = redis.pipeline(transaction=False)
+        pipe.zrem(RedisKey.BLOG_ARTICLE_HOT, article_id)
+        for days in self.windows:
+            pipe.zrem(RedisKey.BLOG_ARTICLE_HOT_WINDOW.format(days), article_id)
+        for offset in range(max(self.windows) + 1):
+            pipe.zrem(self.day_key(today - timedelta(days=offset)), article_id)
+        pipe.delete(RedisKey.BLOG_ARTICLE_UNIQUE_VISIT.format(article_id))
+        pipe.execute()
+
+
+class VisitCounter:
+    """文章访问统计
+
+    访问数先在进程内累加，每隔flush_interval秒用一个pipeline批量写入redis，
+    写入由后台线程定时触发，空闲的进程缓冲的访问数也不会超过flush_interval秒，进程被kill -9时最多丢失这部分；
+    redis里保存总访问数和按天的增量，snapshot_visits命令定时把按天增量写入ArticleVisit表。
+    读取顺序：进程内缓存 -> redis -> db，redis被清空时用db中的数据恢复总访问数。
+    redis不可用时访问数留在进程内缓冲，redis恢复后的第一次flush一起写入；
+    这期间总访问数用最后一次从redis读到的值，没读到过的从db汇总，都在进程内缓存fallback_ttl秒。
+    """
+    # 进程内缓冲写入redis的间隔，单位秒
+    flush_interval: float = 5
+    # redis不可用时总访问数在进程内的缓存时间，单位秒
+    fallback_ttl: float = 30
+    # redis不可用时最多缓冲的访客标识数，访客标识只用于估算独立访客，超出的部分丢弃，避免长时间不可用时占用过多内存
+    max_pending_visitors: int = 100000
+
+    def __init__(self, ranking: HotRanking):
+        # 热门排行和独立访客统计，和访问数在同一个pipeline中写入
+        self.ranking: HotRanking = ranking
+        # article_id => redis中的总访问数
+        self.totals = LRUCache(maxsize=1024, ttl=60)
+        # article_id => 还没写入redis的访问数
+        self._pending: Counter = Counter()
+        # article_id => 还没写入redis的访客标识
+        self._visitors: defaultdict[int, set[str]] = defaultdict(set)
+        # article_id => 最后一次从redis读到的总访问数，redis不可用时使用
+        self._last_totals: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._last_flush: float = time.monotonic()
+        # 后台写入线程所在的进程id，uwsgi的worker是fork出来的，线程不会跟着fork，每个进程第一次访问时启动
+        self._flusher_pid: Optional[int] = None
+        # 进程正常退出时写入剩余的访问数
+        atexit.register(self.flush)
+
+    def incr(self, article_id: int, visitor: str = '') -> int:
+        """访问数加1，返回最新访问数，visitor为访客标识，用于统计独立访客"""
+        article_id = int(article_id)
+        with self._lock:
+            self._pending[article_id] += 1
+            if visitor:
+                self._visitors[article_id].add(visitor)
+        if self._flusher_pid != os.getpid():
+            self.start_flusher()
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return self.get_counts([article_id])[0]
+
+    def start_flusher(self) -> None:
+        """启动后台写入线程，uwsgi需要开启enable-threads"""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self.flush_forever, name='visit-counter-flusher', daemon=True).start()
+
+    def flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('访问数写入redis失败')
+
+    def get_counts(self, article_ids: list[int]) -> list[int]:
+        """批量获取访问数，包含进程内还没写入redis的部分"""
+        article_ids = [int(article_id) for article_id in article_ids]
+        totals: dict[int, int] = {}
+        missing_ids: list[int] = []
+        for article_id in article_ids:
+            total: Optional[int] = self.totals.get(article_id)
+            if total is None:
+                missing_ids.append(article_id)
+            else:
+                totals[article_id] = total
+        if missing_ids:
+            totals.update(self.load_totals(missing_ids))
+        with self._lock:
+            return [totals.get(article_id, 0) + self._pending[article_id] for article_id in article_ids]
+
+    def load_totals(self, article_ids: list[int]) -> dict[int, int]:
+        """从redis读取总访问数，redis不可用时从db汇总"""
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.exists(RedisKey.BLOG_ARTICLE_VISIT_READY)
+            pipe.hmget(RedisKey.BLOG_ARTICLE_VISIT, article_ids)
+            ready, counts = pipe.execute()
+            if not ready and self.restore():
+                counts = redis.hmget(RedisKey.BLOG_ARTICLE_VISIT, article_ids)
+        except RedisError:
+            return self.load_fallback_totals(article_ids)
+        totals: dict[int, int] = {}
+        for article_id, count in zip(article_ids, counts):
+            totals[article_id] = int(count) if count is not None else 0
+            self.totals.set(article_id, totals[article_id])
+            self._last_totals[article_id] = totals[article_id]
+        return totals
+
+    def load_fallback_totals(self, article_ids: list[int]) -> dict[int, int]:
+        """redis不可用时的总访问数，短时间缓存，不用每个请求都查库"""
+        totals: dict[int, int] = {
+            article_id: self._last_totals[article_id] for article_id in article_ids if article_id in self._last_totals
+        }
+        missing_ids: list[int] = [article_id for article_id in article_ids if article_id not in totals]
+        if missing_ids:
+            totals.update(self.load_totals_from_db(missing_ids))
+        for article_id in article_ids:
+            totals.setdefault(article_id, 0)
+            self.totals.set(article_id, totals[article_id], ttl=self.fallback_ttl)
+        return totals
+
+    def load_totals_from_db(self, article_ids: Optional[list[int]] = None) -> dict[int, int]:
+        records: QuerySet[dict] = ArticleVisit.objects.all()
+        if article_ids is not None:
+            records = records.filter(article__in=article_ids)
+        records = records.values('article').annotate(total=Sum('count'))
+        return {record['article']: record['total'] for record in records}
+
+    def restore(self, attempts: int = 3) -> bool:
+        """redis中总访问数不完整时，用db中的数据重建，返回是否执行了重建
+
+        总访问数 = db汇总 + 还没写入db的按天增量，重建时整体覆盖，不在现有总访问数上累加，
+        只丢失了READY标记、总访问数还在时也不会重复计算。
+        WATCH总访问数、按天增量和READY标记，统计期间有访问数写入或者其他进程已经重建时放弃本次写入。
+        """
+        watched_keys: list[str] = [
+            RedisKey.BLOG_ARTICLE_VISIT, RedisKey.BLOG_ARTICLE_VISIT_DAYS, RedisKey.BLOG_ARTICLE_VISIT_READY
+        ]
+        for _ in range(attempts):
+            with redis.pipeline(transaction=True) as pipe:
+                pipe.watch(*watched_keys)
+                if pipe.exists(RedisKey.BLOG_ARTICLE_VISIT_READY):
+                    return False
+                days: set[str] = pipe.smembers(RedisKey.BLOG_ARTICLE_VISIT_DAYS)
+                day_keys: list[str] = [RedisKey.BLOG_ARTICLE_VISIT_DAY.format(day) for day in days]
+                if day_keys:
+                    pipe.watch(*day_keys)
+                totals: dict[int, int] = self.load_totals_from_db()
+                for day_key in day_keys:
+                    for article_id, count in pipe.hgetall(day_key).items():
+                        totals[int(article_id)] = totals.get(int(article_id), 0) + int(count)
+                pipe.multi()
+                pipe.delete(RedisKey.BLOG_ARTICLE_VISIT)
+                if totals:
+                    pipe.hset(RedisKey.BLOG_ARTICLE_VISIT, mapping=totals)
+                pipe.set(RedisKey.BLOG_ARTICLE_VISIT_READY, 1)
+                # 热门排行按重建后的访问数重建
+                pipe.delete(RedisKey.BLOG_ARTICLE_HOT_READY)
+                try:
+                    pipe.execute()
+                except WatchError:
+                    continue
+            return True
+        return False
+
+    def flush(self) -> None:
+        """把进程内累加的访问数写入redis"""
+        with self._lock:
+            pending: Counter = self._pending
+            visitors: defaultdict[int, set[str]] = self._visitors
+            self._pending = Counter()
+            self._visitors = defaultdict(set)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        today: date = date.today()
+        day: str = today.isoformat()
+        day_key: str = RedisKey.BLOG_ARTICLE_VISIT_DAY.format(day)
+        article_ids: list[int] = list(pending.keys())
+        try:
+            # 访问数和排行在同一个事务中更新，排行重新合并时不会重复或者漏掉增量
+            pipe = redis.pipeline(transaction=True)
+            for article_id in article_ids:
+                pipe.hincrby(RedisKey.BLOG_ARTICLE_VISIT, article_id, pending[article_id])
+            for article_id in article_ids:
+                pipe.hincrby(day_key, article_id, pending[article_id])
+            pipe.sadd(RedisKey.BLOG_ARTICLE_VISIT_DAYS, day)
+            self.ranking.record(pipe, today, pending, visitors)
+            results: list = pipe.execute()
+        except RedisError:
+            # 写入失败放回缓冲，下次再写
+            with self._lock:
+                self._pending.update(pending)
+                if sum(len(ids) for ids in self._visitors.values()) < self.max_pending_visitors:
+                    for article_id, ids in visitors.items():
+                        self._visitors[article_id].update(ids)
+            # redis恢复后马上写入，不等下一次访问
+            redis_breaker.defer('visit_counter.flush', self.flush)
+            return
+        # hincrby返回最新总数，直接更新进程内缓存
+        for article_id, total in zip(article_ids, results):
+            self.totals.set(article_id, total)
+            self._last_totals[article_id] = total
+
+    def remove(self, article_id: int) -> None:
+        """删除文章时清理访问统计"""
+        article_id = int(article_id)
+        with self._lock:
+            self._pending.pop(article_id, None)
+            self._visitors.pop(article_id, None)
+        self.totals.delete(article_id)
+        self._last_totals.pop(article_id, None)
+        try:
+            redis.hdel(RedisKey.BLOG_ARTICLE_VISIT, article_id)
+            self.ranking.remove(article_id)
+        except RedisError:
+            # 文章已经从db删除，redis恢复后再清理
+            redis_breaker.defer('visit_counter.remove.{0}'.format(article_id), lambda: self.remove(article_id))
+
+    def snapshot(self) -> int:
+        """把redis中按天的访问增量写入db，返回写入的记录数"""
+        self.flush()
+        written: int = 0
+        for day in redis.smembers(RedisKey.BLOG_ARTICLE_VISIT_DAYS):
+            day_key: str = RedisKey.BLOG_ARTICLE_VISIT_DAY.format(day)
+            # 在事务里取出并删除，避免取出后、删除前写入的增量丢失
+            pipe = redis.pipeline(transaction=True)
+            pipe.hgetall(day_key)
+            pipe.delete(day_key)
+            pipe.srem(RedisKey.BLOG_ARTICLE_VISIT_DAYS, day)
+            counts, _, _ = pipe.execute()
+            written += self.save_day(date.fromisoformat(day), {int(k): int(v) for k, v in counts.items()})
+        return written
+
+    def save_day(self, day: date, counts: dict[int, int]) -> int:
+        """累加一天的访问增量到db，已删除的文章直接忽略"""
+        article_ids: set[int] = set(Article.objects.filter(id__in=counts.keys()).values_list('id', flat=True))
+        counts = {article_id: count for article_id, count in counts.items() if article_id in article_ids}
+        if not counts:
+            return 0
+        with transaction.atomic():
+            records: QuerySet[ArticleVisit] = (
+                ArticleVisit.objects.select_for_update().filter(date=day, article__in=counts.keys())
+            )
+            exist_records: list[ArticleVisit] = list(records)
+            for record in exist_records:
+                record.count += counts.pop(record.article_id)
+            ArticleVisit.objects.bulk_update(exist_records, ['count'])
+            new_records: list[ArticleVisit] = [
+                ArticleVisit(article_id=article_id, date=day, count=count) for article_id, count in counts.items()
+            ]
+            ArticleVisit.objects.bulk_create(new_records)
+        return len(exist_records) + len(new_records)
+
+    def save_baseline(self) -> int:
+        """把redis中已有、但db里没有的历史访问数记到今天，用于首次上线时保存历史数据"""
+        self.snapshot()
+        db_totals: dict[int, int] = self.load_totals_from_db()
+        counts: dict[int, int] = {}
+        for article_id, total in redis.hgetall(RedisKey.BLOG_ARTICLE_VISIT).items():
+            diff: int = int(total) - db_totals.get(int(article_id), 0)
+            if diff > 0:
+                counts[int(article_id)] = diff
+        redis.set(RedisKey.BLOG_ARTICLE_VISIT_READY, 1)
+        return self.save_day(date.today(), counts)
+
+
+class MetricsCollector:
+    """接口性能数据汇总
+
+    每个请求的数据先在进程内按qualified_name累加，每隔flush_interval秒用一个pipeline写入redis，
+    redis中每个接口一个hash，所有进程的数据汇总在一起，同时每个请求输出一行json日志。
+    """
+    # 进程内汇总写入redis的间隔，单位秒
+    flush_interval: float = 10
+    # 累加的字段
+    fields: tuple[str, ...] = (
+        'auth_time', 'handler_time', 'serialize_time', 'sql_count', 'sql_time', 'redis_count'
+    )
+
+    def __init__(self):
+        # qualified_name => {field: value}
+        self._pending: dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._last_flush: float = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, metrics: RequestMetrics, flush: bool = True) -> bool:
+        """记录单次请求的性能数据，返回是否需要写入redis
+
+        Args:
+            metrics: 请求的性能数据
+            flush: 需要写入redis时是否立即写入，异步view传False，自行在线程中调用flush()
+        """
+        logger.info(json.dumps(metrics.to_dict()))
+        with self._lock:
+            counter: Counter = self._pending.setdefault(metrics.qualified_name, Counter())
+            counter['count'] += 1
+            counter['failed'] += int(metrics.failed)
+            for field in self.fields:
+                counter[field] += getattr(metrics, field)
+            counter['max_time'] = max(counter['max_time'], metrics.auth_time + metrics.handler_time)
+        flush_due: bool = time.monotonic() - self._last_flush >= self.flush_interval
+        if flush_due and flush:
+            self.flush()
+        return flush_due
+
+    def flush(self) -> None:
+        with self._lock:
+            pending: dict[str, Counter] = self._pending
+            self._pending = {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for name, counter in pending.items():
+                key: str = RedisKey.BLOG_METRICS.format(name)
+                for field, value in counter.items():
+                    if field == 'max_time':
+                        continue
+                    if isinstance(value, float):
+                        pipe.hincrbyfloat(key, field, value)
+                    else:
+                        pipe.hincrby(key, field, value)
+                pipe.sadd(RedisKey.BLOG_METRICS_NAMES, name)
+            pipe.execute()
+            # 最大耗时需要比较后再写，单独处理
+            for name, counter in pending.items():
+                key: str = RedisKey.BLOG_METRICS.format(name)
+                if float(redis.hget(key, 'max_time') or 0) < counter['max_time']:
+                    redis.hset(key, 'max_time', counter['max_time'])
+        except RedisError:
+            # 性能数据允许丢失，不放回缓冲
+            pass
+
+    def summary(self) -> list[dict]:
+        """所有接口的平均耗时，单位毫秒"""
+        self.flush()
+        names: list[str] = sorted(redis.smembers(RedisKey.BLOG_METRICS_NAMES))
+        pipe = redis.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(RedisKey.BLOG_METRICS.format(name))
+        records: list[dict] = []
+        for name, values in zip(names, pipe.execute()):
+            count: int = int(values.get('count', 0))
+            if not count:
+                continue
+            records.append({
+                'name': name,
+                'count': count,
+                'failed': int(values.get('failed', 0)),
+                'auth_ms': round(self.average(values, 'auth_time') * 1000, 3),
+                'handler_ms': round(self.average(values, 'handler_time') * 1000, 3),
+                'serialize_ms': round(self.average(values, 'serialize_time') * 1000, 3),
+                'max_ms': round(float(values.get('max_time', 0)) * 1000, 3),
+                'sql_count': round(self.average(values, 'sql_count'), 2),
+                'sql_ms': round(self.average(values, 'sql_time') * 1000, 3),
+                'redis_count': round(self.average(values, 'redis_count'), 2),
+            })
+        return records
+
+    def average(self, values: dict[str, str], field: str) -> float:
+        """redis中累加的字段除以请求数"""
+        return float(values.get(field, 0)) / int(values['count'])
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = {}
+        names: set[str] = redis.smembers(RedisKey.BLOG_METRICS_NAMES)
+        if names:
+            redis.delete(*[RedisKey.BLOG_METRICS.format(name) for name in names])
+        redis.delete(RedisKey.BLOG_METRICS_NAMES)
+
+
+last_login_buffer = LastLoginBuffer()
+hot_ranking = HotRanking()
+visit_counter = VisitCounter(hot_ranking)
+metrics_collector = MetricsCollector()
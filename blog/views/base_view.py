@@ -2,26 +2,45 @@ from __future__ import annotations
 
 import json
 import time
+import base64
+import asyncio
+import logging
 import hashlib
+import uuid
 
 from typing import TYPE_CHECKING
 from datetime import datetime
+from functools import wraps
+from collections import Counter
+from contextlib import ExitStack
 
 import jwt
+from asgiref.sync import sync_to_async
 from django.views import View
-from django.http import JsonResponse
-from django.db import models
-from django.db.models import ObjectDoesNotExist
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import models, connections, InterfaceError, OperationalError
+from django.db.models import ObjectDoesNotExist, Q
 from django.conf import settings
+from django.utils.http import parse_etags
+from redis import RedisError
 
-from blog import qualified_key_mapping
-from blog.models import User, Group
+from blog import redis, get_async_redis
+from blog.cache import permission_cache, token_cache
+from blog.db_router import ReplicaChoice, current_replica, replica_selector
+from blog.static_config import authority_config
+from blog.metrics import RequestMetrics, current_metrics
+from blog.serializers import JSONSerializer, json_serializer
+from blog.tracking import last_login_buffer, metrics_collector
+from blog.services import RedisKey
 
 if TYPE_CHECKING:
-    from typing import Optional, Callable
+    from typing import Any, Iterable, Optional, Callable
     from django.db.models import QuerySet
     from django.http import HttpRequest
 
+logger = logging.getLogger('blog')
+
 
 class TokenMixin:
     def encode_token(self, payload: dict) -> str:
@@ -36,20 +55,115 @@ class TokenMixin:
 
 
 class ResponseMixin:
-    def success(self, data: Optional[dict] = None, msg: str = 'ok', code: int = 0) -> JsonResponse:
+    # 响应序列化器，默认安装了orjson时使用orjson，可在view中替换
+    serializer: JSONSerializer = json_serializer
+
+    def success(self, data: Optional[dict] = None, msg: str = 'ok', code: int = 0) -> HttpResponse:
+        start: float = time.perf_counter()
         res = {'ret': code, 'msg': msg}
         if data is not None:
             res['data'] = data
-        return JsonResponse(res)
+        response = HttpResponse(self.serializer.dumps(res), content_type='application/json')
+        self.record_serialize_time(start)
+        return response
+
+    def success_stream(
+            self, rows: Iterable[dict], data: Optional[dict] = None, msg: str = 'ok', code: int = 0
+    ) -> StreamingHttpResponse:
+        """
+        大列表逐行序列化并流式输出，响应格式同success，data为None时rows作为data，否则rows放在data.lists中
+        rows通常是QuerySet.iterator()，在输出响应时才查库，所以查库和序列化的耗时不计入接口性能数据
+        """
+        content = self.serializer.iter_response(rows, data, msg, code)
+        return StreamingHttpResponse(content, content_type='application/json')
 
-    def fail(self, code: int, msg: str) -> JsonResponse:
-        return JsonResponse({
+    def success_json(self, data_json: str, msg: str = 'ok', code: int = 0) -> HttpResponse:
+        """data已经是序列化好的json字符串时使用，直接拼接响应体，不再重复序列化"""
+        start: float = time.perf_counter()
+        content: str = '{{"ret": {0}, "msg": {1}, "data": {2}}}'.format(code, json.dumps(msg), data_json)
+        response = HttpResponse(content, content_type='application/json')
+        self.record_serialize_time(start)
+        return response
+
+    def fail(self, code: int, msg: str) -> HttpResponse:
+        start: float = time.perf_counter()
+        response = HttpResponse(self.serializer.dumps({
             'ret': code,
             'msg': msg
-        })
+        }), content_type='application/json')
+        self.record_serialize_time(start, failed=True)
+        return response
+
+    def make_etag(self, key: str, version: Optional[str], epoch: str) -> str:
+        """由版本号key、版本号和纪元生成强ETag"""
+        digest: str = hashlib.md5('{0}:{1}:{2}'.format(epoch, key, version or '0').encode(encoding='utf-8')).hexdigest()
+        return '"{0}"'.format(digest[:16])
+
+    def etag_matches(self, request: HttpRequest, etag: str) -> bool:
+        """If-None-Match中是否包含etag，按弱比较忽略W/前缀"""
+        header: str = request.headers.get('If-None-Match', '')
+        if not header:
+            return False
+        etags: list[str] = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(header)]
+        return '*' in etags or etag in etags
+
+    def not_modified(self, etag: str) -> HttpResponse:
+        response = HttpResponseNotModified()
+        self.set_etag(response, etag)
+        return response
+
+    def set_etag(self, response: HttpResponse, etag: str) -> HttpResponse:
+        """失败的响应不带ETag，避免客户端缓存错误信息"""
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if response.status_code in (200, 304) and not (metrics and metrics.failed):
+            response['ETag'] = etag
+            # 允许浏览器和CDN缓存，但每次使用前都要带着ETag回源确认
+            response['Cache-Control'] = 'no-cache'
+        return response
+
+    def record_serialize_time(self, start: float, failed: bool = False) -> None:
+        """把序列化耗时记入当前请求的性能数据"""
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        if metrics is not None:
+            metrics.serialize_time += time.perf_counter() - start
+            metrics.failed = metrics.failed or failed
+
+
+class QueryBudgetExceeded(AssertionError):
+    """QUERY_BUDGET_STRICT为True时，handler超出查询预算或出现N+1抛出"""
+
+
+class QueryBudgetMixin:
+    # 各handler最多执行的sql数，不包含鉴权，e.g. {'get': 2, 'put': 5}，没有声明的handler不限制数量
+    query_budgets: dict[str, int] = {}
+    # 同一条sql（忽略参数）在一个handler中执行多少次视为N+1
+    n_plus_one_threshold: int = 3
+
+    def check_query_budget(self, handler: Callable, shapes: list[str]) -> None:
+        """
+        检查handler执行的sql，超出预算或者疑似N+1时记录warning日志，
+        测试环境设置QUERY_BUDGET_STRICT = True，直接抛出异常让测试失败
+        """
+        problems: list[str] = []
+        budget: Optional[int] = self.query_budgets.get(handler.__name__)
+        if budget is not None and len(shapes) > budget:
+            problems.append('执行了{0}条sql，超出预算{1}条'.format(len(shapes), budget))
+        for shape, count in Counter(shapes).items():
+            if count >= self.n_plus_one_threshold:
+                problems.append('同一条sql执行了{0}次，疑似N+1：{1}'.format(count, shape[:300]))
+        if not problems:
+            return
+        message: str = '{0}：{1}'.format(handler.__qualname__, '；'.join(problems))
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
 
 
 class DataProcessingMixin:
+    # 游标分页默认每页条数和最大条数
+    page_size: int = 20
+    max_page_size: int = 100
+
     def password_to_md5(self, password: str) -> str:
         m = hashlib.md5()
         password_encoded: bytes = password.encode(encoding='utf-8')
@@ -65,36 +179,51 @@ class DataProcessingMixin:
                 time_field: datetime = record.get(field)
                 record[field] = str(time_field.replace(microsecond=0))
 
-    def handle_pagination(self, records: QuerySet, pagination_str: str) -> (QuerySet, list):
-        # 获取总条数
-        total: int = records.count()
-        # 计算分页切片索引
-        current: int = 1
-        page_size: int = 5
-        if pagination_str:
-            pagination: dict = json.loads(pagination_str)
-            current = pagination.get('current', current)
-            page_size = pagination.get('page_size', page_size)
-        top: int = (current - 1) * page_size
-        bottom: int = top + page_size
-        records = records[top:bottom]
-        return records, [total, current, page_size]
-
-    def get_keys_of_user(self, user: User) -> list[str]:
-        groups: QuerySet[Group] = user.group.all()
-        if not groups.exists():
-            return []
-        records: list[dict] = []
-        for group in groups:
-            records.extend(group.permission_set.values('name'))
-        # keys里面只有操作权限，没包含页面权限
-        keys: list[str] = [record['name'] for record in records]
-        return keys
-
-
-class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
+    def handle_pagination(self, records: QuerySet[dict], pagination_str: str) -> (list[dict], Optional[str]):
+        """游标分页，不使用offset和count，每页只查page_size + 1条
+
+        records需要按 -update_time, -id 排序，并且values中包含update_time和id
+        pagination => {"cursor": "上一页返回的next_cursor，第一页不传", "page_size": 20}
+        返回当前页数据和下一页游标，没有下一页时游标为None
+        """
+        pagination: dict = json.loads(pagination_str)
+        page_size: int = int(pagination.get('page_size', self.page_size))
+        page_size = min(max(page_size, 1), self.max_page_size)
+        cursor: str = pagination.get('cursor', '')
+        if cursor:
+            update_time, record_id = self.decode_cursor(cursor)
+            records = records.filter(Q(update_time__lt=update_time) | Q(update_time=update_time, id__lt=record_id))
+        # 多查一条判断是否还有下一页
+        page: list[dict] = list(records[:page_size + 1])
+        next_cursor: Optional[str] = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last: dict = page[-1]
+            next_cursor = self.encode_cursor(last['update_time'], last['id'])
+        return page, next_cursor
+
+    def encode_cursor(self, update_time: datetime, record_id: int) -> str:
+        value: str = '{0}|{1}'.format(update_time.isoformat(), record_id)
+        return base64.urlsafe_b64encode(value.encode(encoding='utf-8')).decode()
+
+    def decode_cursor(self, cursor: str) -> (datetime, int):
+        try:
+            value: str = base64.urlsafe_b64decode(cursor.encode()).decode(encoding='utf-8')
+            update_time, record_id = value.split('|')
+            return datetime.fromisoformat(update_time), int(record_id)
+        except ValueError:
+            raise ValueError('无效的分页游标')
+
+
+class BaseView(View, TokenMixin, ResponseMixin, QueryBudgetMixin, DataProcessingMixin):
     view_name = ''
     actions = {'get': '获取', 'post': '新增', 'put': '修改', 'delete': '删除'}
+    # 前台GET请求的查询是否走只读库
+    read_replica: bool = False
+    # 前台响应缓存的有效时间，单位秒，None时只在内容版本号变化时失效
+    cache_ttl: Optional[int] = None
+    # 决定前台响应内容的查询参数，响应缓存的key只包含这些参数，None时包含全部参数
+    cache_params: Optional[tuple[str, ...]] = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -117,36 +246,145 @@ class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
 
         # 新增部分
         # ========================================
+        # 记录接口性能数据，qualified_name e.g. ArticlesView.get
+        metrics = RequestMetrics(handler.__qualname__)
+        token = current_metrics.set(metrics)
+        try:
+            return self._call_with_sql_metrics(self._dispatch_with_metrics, request, handler, metrics, *args, **kwargs)
+        finally:
+            current_metrics.reset(token)
+            metrics_collector.record(metrics)
+        # ========================================
+
+    def _call_with_sql_metrics(self, func: Callable, *args, **kwargs) -> Any:
+        """执行func，统计其中所有数据库连接上执行的sql"""
+        metrics: Optional[RequestMetrics] = current_metrics.get()
+        with ExitStack() as stack:
+            if metrics is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.sql_wrapper))
+            return func(*args, **kwargs)
+
+    def _dispatch_with_metrics(
+            self, request: HttpRequest, handler: Callable, metrics: RequestMetrics, *args, **kwargs
+    ) -> JsonResponse:
+        """鉴权并执行view，分别记录鉴权和view的耗时，耗时中不包含序列化"""
+        start: float = time.perf_counter()
         # 鉴权失败会返回错误response，直接返回
-        if response := self._verify_token_and_permission(request, handler):
+        response: Optional[JsonResponse] = self._verify_token_and_permission(request, handler)
+        auth_end: float = time.perf_counter()
+        metrics.auth_time = auth_end - start - metrics.serialize_time
+        if response:
             return response
         # 执行view
-        return self._execute_handler(request, handler, *args, **kwargs)
-        # ========================================
+        serialize_time: float = metrics.serialize_time
+        sql_index: int = len(metrics.sql_shapes)
+        response = self._execute_handler(request, handler, *args, **kwargs)
+        metrics.handler_time = time.perf_counter() - auth_end - (metrics.serialize_time - serialize_time)
+        self.check_query_budget(handler, metrics.sql_shapes[sql_index:])
+        return response
 
     def _execute_handler(self, request: HttpRequest, handler: Callable, *args, **kwargs) -> JsonResponse:
         """dispatch 找到对应handler之后，会把handler传进来执行，这里处理view抛出的各种异常和None"""
+        etag: Optional[str] = None
         try:
-            # 执行view，有response就返回，没response返回拼接的msg
-            if response := handler(request, *args, **kwargs):
-                # 返回handler给定的response
-                return response
-            else:
-                msg: str = '{0}{1}成功'.format(self.view_name, self.actions[handler.__name__])
-                return self.success(msg=msg)
+            # 内容版本没有变化时直接返回304，不执行handler
+            etag = self._get_etag(request)
+            if etag and self.etag_matches(request, etag):
+                return self.not_modified(etag)
+            # 写操作之前标记一段时间内读走主库
+            if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                replica_selector.pin()
+            response: Optional[HttpResponse] = self._call_handler(request, handler, *args, **kwargs)
+        except Exception as e:
+            return self._handle_exception(handler, e)
+        response = self._handle_response(handler, response)
+        return self.set_etag(response, etag) if self._can_set_etag(request, etag) else response
+
+    def _can_set_etag(self, request: HttpRequest, etag: Optional[str]) -> bool:
+        # 响应缓存返回了旧版本的内容时不带ETag，ETag是按当前版本号生成的
+        return bool(etag) and not getattr(request, 'stale_response', False)
+
+    def _call_handler(self, request: HttpRequest, handler: Callable, *args, **kwargs) -> Optional[HttpResponse]:
+        """
+        执行handler，前台读接口的查询走只读库，只读库查询失败时标记为不可用，在主库上重新执行
+        只读库在第一次读查询时才选择，命中响应缓存时不需要选择
+        """
+        if not self._use_replica(request):
+            return handler(request, *args, **kwargs)
+        choice = ReplicaChoice()
+        token = current_replica.set(choice)
+        try:
+            return handler(request, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            if choice.chosen_alias is None:
+                raise
+            replica_selector.mark_down(choice.chosen_alias)
+            logger.warning(
+                '只读库%s查询失败，%s在主库上重新执行', choice.chosen_alias, handler.__qualname__, exc_info=True
+            )
+        finally:
+            current_replica.reset(token)
+        return handler(request, *args, **kwargs)
+
+    def _use_replica(self, request: HttpRequest) -> bool:
+        # 后台接口读写都在主库，管理员总能读到自己刚写入的数据；没有配置只读库时直接走主库
+        return (
+            self.read_replica and request.method == 'GET' and 'front' in request.path
+            and bool(replica_selector.aliases)
+        )
+
+    def _handle_response(self, handler: Callable, response: Optional[HttpResponse]) -> HttpResponse:
+        # 执行view，有response就返回，没response返回拼接的msg
+        if response:
+            # 返回handler给定的response
+            return response
+        msg: str = '{0}{1}成功'.format(self.view_name, self.actions[handler.__name__])
+        return self.success(msg=msg)
 
+    def _handle_exception(self, handler: Callable, e: Exception) -> JsonResponse:
         # 通常缺少必要参数会触发这个异常
-        except ValueError as e:
+        if isinstance(e, ValueError):
             return self.fail(10020, str(e))
         # model.object.get()通常会触发这个异常，没找到对应的record
-        except models.ObjectDoesNotExist:
+        if isinstance(e, models.ObjectDoesNotExist):
             msg: str = '{0}不存在，{1}失败'.format(self.view_name, self.actions[handler.__name__])
             return self.fail(10021, msg)
+        # 前台读接口在redis不可用时都有降级，走到这里的是必须用到redis的操作，不按未知异常打印堆栈
+        if isinstance(e, RedisError):
+            logger.warning('%s执行失败，redis不可用：%s', handler.__qualname__, e)
+            return self.fail(10002, '服务暂时不可用，请稍后重试')
         # 其他未知异常
-        except Exception as e:
-            print(e)
-            print(getattr(handler, '__code__'))
-            return self.fail(10001, '服务器错误')
+        logger.exception('%s执行失败', handler.__qualname__, exc_info=e)
+        return self.fail(10001, '服务器错误')
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        """
+        支持条件请求的前台接口重写此方法，返回决定响应内容的版本号的redis key，
+        版本号不变时同一url的响应内容不变。返回None表示不支持条件请求。
+        """
+        return None
+
+    def _get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 只处理前台GET请求，后台接口需要鉴权，不走条件请求；组合接口的子请求随组合接口整体返回，也不走条件请求
+        if request.method != 'GET' or 'front' not in request.path or getattr(request, 'bundled', False):
+            return None
+        return self.get_etag_key(request)
+
+    def _get_etag(self, request: HttpRequest) -> Optional[str]:
+        key: Optional[str] = self._get_etag_key(request)
+        if not key:
+            return None
+        try:
+            version, epoch = redis.mget(key, RedisKey.BLOG_ETAG_EPOCH)
+            if not epoch:
+                epoch = uuid.uuid4().hex
+                if not redis.set(RedisKey.BLOG_ETAG_EPOCH, epoch, nx=True):
+                    epoch = redis.get(RedisKey.BLOG_ETAG_EPOCH)
+            return self.make_etag(key, version, epoch)
+        except RedisError:
+            # 版本号不可用时不生成ETag，正常返回完整响应
+            return None
 
     def _verify_token_and_permission(self, request: HttpRequest, handler: Callable) -> Optional[JsonResponse]:
         """在执行view之前校验token有效性和权限有效性"""
@@ -160,7 +398,7 @@ class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
             return response
         # qualified_name e.g. GroupsView.get
         qualified_name: str = handler.__qualname__
-        authority_key: str = qualified_key_mapping.get(qualified_name, '')
+        authority_key: str = authority_config.qualified_key_mapping.get(qualified_name, '')
         # 如果获取到key，说明接口需要权限可以才能访问
         if authority_key:
             # 校验用户权限
@@ -176,13 +414,19 @@ class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
             # 校验token格式
             token: str = authorization.replace('Bearer ', '')
             assert token
-            # decode失败可能会抛出多个不同的异常异常
-            payload: dict = self.decode_token(token)
+            # 校验过的token直接取缓存，不再解码和校验签名
+            payload: Optional[dict] = token_cache.get(token)
+            cached: bool = payload is not None
+            if not cached:
+                # decode失败可能会抛出多个不同的异常异常
+                payload = self.decode_token(token)
             # 校验过期时间
             expire_time: int = payload.get('expire_time')
             now: int = time.time()
             if expire_time < now:
                 raise TimeoutError
+            if not cached:
+                token_cache.set(token, payload)
             self.payload = payload
 
         except AssertionError:
@@ -198,18 +442,17 @@ class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
         """校验用户权限 success -> None  fail -> response"""
         try:
             user_id: int = self.payload.get('id')
-            # 校验用户是否存在
-            user: User = User.objects.get(id=user_id)
+            # 校验用户是否存在，用户状态和权限key走缓存，不存在时抛出ObjectDoesNotExist
+            permission: dict = permission_cache.get(user_id)
             # 断言失败会抛出AssertionError
-            assert user.is_active
-            # 更新最近登录时间
-            user.last_login = datetime.now()
-            user.save()
+            assert permission['is_active']
+            # 更新最近登录时间，先写入缓冲，由flush_last_login命令批量写回db
+            last_login_buffer.touch(user_id)
             # 管理员不校验权限
-            if user.is_admin:
+            if permission['is_admin']:
                 return
             # 如果没有权限key或者没有包含接口的key，则鉴权失败
-            keys: list[str] = self.get_keys_of_user(user)
+            keys: list[str] = permission['keys']
             if not keys or authority_key not in keys:
                 raise PermissionError
         except AssertionError:
@@ -224,3 +467,138 @@ class BaseView(View, TokenMixin, ResponseMixin, DataProcessingMixin):
         for key, value in kwargs.items():
             if not value:
                 raise ValueError('缺少必要参数{0}'.format(key))
+
+
+class AsyncBaseView(BaseView):
+    """异步view基类，用于前台高并发的读接口
+
+    async def 的handler在事件循环中执行，其中的ORM等同步代码通过run_sync放到线程中执行；
+    普通def的handler（后台的增删改）和鉴权整体放到线程中执行。
+    ASGI下慢的redis或mysql调用只挂起当前协程，不会占住整个worker。
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # django3.2的View.as_view只返回同步函数，包一层协程函数，让django按异步view处理
+        @wraps(view)
+        async def async_view(request: HttpRequest, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+
+        # 记录接口性能数据，同BaseView.dispatch
+        metrics = RequestMetrics(handler.__qualname__)
+        token = current_metrics.set(metrics)
+        try:
+            start: float = time.perf_counter()
+            response: Optional[JsonResponse] = await self._averify_token_and_permission(request, handler)
+            auth_end: float = time.perf_counter()
+            metrics.auth_time = auth_end - start - metrics.serialize_time
+            if response:
+                return response
+            serialize_time: float = metrics.serialize_time
+            sql_index: int = len(metrics.sql_shapes)
+            response = await self._aexecute_handler(request, handler, *args, **kwargs)
+            metrics.handler_time = time.perf_counter() - auth_end - (metrics.serialize_time - serialize_time)
+            self.check_query_budget(handler, metrics.sql_shapes[sql_index:])
+            return response
+        finally:
+            current_metrics.reset(token)
+            # 写入redis的部分放到线程中执行
+            if metrics_collector.record(metrics, flush=False):
+                await sync_to_async(metrics_collector.flush, thread_sensitive=False)()
+
+    async def run_sync(self, func: Callable, *args, thread_sensitive: bool = True, **kwargs) -> Any:
+        """在线程中执行同步代码并统计其中的sql
+
+        Args:
+            func: 同步函数
+            thread_sensitive: 涉及ORM时必须为True；只访问redis等线程安全的资源时可以为False，不和ORM抢同一个线程
+        """
+        return await sync_to_async(self._call_with_sql_metrics, thread_sensitive=thread_sensitive)(
+            func, *args, **kwargs
+        )
+
+    async def _averify_token_and_permission(self, request: HttpRequest, handler: Callable) -> Optional[JsonResponse]:
+        path: str = request.path
+        # 前端接口和登录接口不需要验证token和权限，不切换线程
+        if 'front' in path or 'token' in path:
+            return
+        # 鉴权需要查用户权限，放到线程中执行
+        return await self.run_sync(self._verify_token_and_permission, request, handler)
+
+    async def _aexecute_handler(self, request: HttpRequest, handler: Callable, *args, **kwargs) -> HttpResponse:
+        """同_execute_handler，async handler直接await，同步handler放到线程中执行"""
+        etag: Optional[str] = None
+        try:
+            etag = await self._aget_etag(request)
+            if etag and self.etag_matches(request, etag):
+                return self.not_modified(etag)
+            if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                await replica_selector.apin()
+            response: Optional[HttpResponse] = await self._acall_handler(request, handler, *args, **kwargs)
+        except Exception as e:
+            return self._handle_exception(handler, e)
+        response = self._handle_response(handler, response)
+        # django3.2的ASGIHandler在事件循环中迭代流式响应，迭代时查库会报错，先在线程中生成完整响应
+        if response.streaming and isinstance(request, ASGIRequest):
+            response = await self.run_sync(self.buffer_streaming, response)
+        return self.set_etag(response, etag) if self._can_set_etag(request, etag) else response
+
+    async def _acall_handler(self, request: HttpRequest, handler: Callable, *args, **kwargs) -> Optional[HttpResponse]:
+        """同_call_handler，只读库在run_sync中第一次读查询时选择，命中响应缓存的请求不切换线程"""
+        if not self._use_replica(request):
+            return await self._ainvoke_handler(request, handler, *args, **kwargs)
+        choice = ReplicaChoice()
+        token = current_replica.set(choice)
+        try:
+            return await self._ainvoke_handler(request, handler, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            if choice.chosen_alias is None:
+                raise
+            replica_selector.mark_down(choice.chosen_alias)
+            logger.warning(
+                '只读库%s查询失败，%s在主库上重新执行', choice.chosen_alias, handler.__qualname__, exc_info=True
+            )
+        finally:
+            current_replica.reset(token)
+        return await self._ainvoke_handler(request, handler, *args, **kwargs)
+
+    async def _ainvoke_handler(
+            self, request: HttpRequest, handler: Callable, *args, **kwargs
+    ) -> Optional[HttpResponse]:
+        # async handler直接await，同步handler放到线程中执行
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request, *args, **kwargs)
+        return await self.run_sync(handler, request, *args, **kwargs)
+
+    def buffer_streaming(self, response: StreamingHttpResponse) -> HttpResponse:
+        buffered = HttpResponse(
+            b''.join(response.streaming_content), content_type=response['Content-Type'], status=response.status_code
+        )
+        response.close()
+        return buffered
+
+    async def _aget_etag(self, request: HttpRequest) -> Optional[str]:
+        """同_get_etag，使用异步redis客户端"""
+        key: Optional[str] = self._get_etag_key(request)
+        if not key:
+            return None
+        async_redis = get_async_redis()
+        try:
+            version, epoch = await async_redis.mget(key, RedisKey.BLOG_ETAG_EPOCH)
+            if not epoch:
+                epoch = uuid.uuid4().hex
+                if not await async_redis.set(RedisKey.BLOG_ETAG_EPOCH, epoch, nx=True):
+                    epoch = await async_redis.get(RedisKey.BLOG_ETAG_EPOCH)
+            return self.make_etag(key, version, epoch)
+        except RedisError:
+            return None
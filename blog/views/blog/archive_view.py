@@ -1,75 +1,81 @@
 from __future__ import annotations
 
 from typing import TYPE_CHECKING
-from collections import Counter
-
-from django.db.models import F, Count
-from django.db.models.functions import TruncMonth
-
-from blog.models import Article, Tag
-from blog.views.base_view import BaseView
+from blog.archive import archive_store
+from blog.cache import request_scope, response_cache, tag_registry
+from blog.models import Category
+from blog.services import RedisKey
+from blog.views.base_view import AsyncBaseView
 
 if TYPE_CHECKING:
-    from datetime import datetime
+    from typing import Callable, Optional
     from django.http import HttpRequest, QueryDict
     from django.db.models import QuerySet
 
 
-class ArchiveView(BaseView):
+class ArchiveView(AsyncBaseView):
     view_name = '归档'
+    # 归档统计未就绪时会从db重建
+    query_budgets = {'get': 5}
+    read_replica = True
+    cache_params = ('cate',)
 
-    def get(self, request: HttpRequest):
+    async def get(self, request: HttpRequest):
         params: QueryDict = request.GET
         cate = params.get('cate', 'category')
-        if cate == 'category':
-            return self.get_category_archive()
-        elif cate == 'tag':
-            return self.get_tag_archive()
-        elif cate == 'month':
-            return self.get_month_archive()
+        builders: dict[str, Callable[[], list]] = {
+            'category': self.get_category_archive,
+            'tag': self.get_tag_archive,
+            'month': self.get_month_archive,
+        }
+        build: Optional[Callable[[], list]] = builders.get(cate)
+        if build is None:
+            return
+        # 归档只在后台写文章时变化，优先走响应缓存
+        data_json: str = await response_cache.aget_or_set(
+            request, lambda: self.run_sync(build), self.cache_ttl, self.cache_params
+        )
+        return self.success_json(data_json)
 
-    def get_category_archive(self):
-        archive: QuerySet[dict] = Article.objects.values('category__name').annotate(
-            text=F('category__name'),
-            count=Count('*')
-        ).values('text', 'count')
-        # 处理未分类
-        for record in archive:
-            if record['text'] is None:
-                record['text'] = '未分类'
-                break
-        return self.success(list(archive))
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 文章和分类的增删改都会递增内容版本号
+        return RedisKey.BLOG_CACHE_VERSION
 
-    def get_tag_archive(self):
-        # 取出所有文章用到的标签
-        # <QuerySet [{'tags': [4, 6]}, {'tags': [7, 5]}, {'tags': [4]}, {'tags': [5, 4]}]>
-        articles: QuerySet[dict] = Article.objects.exclude(tags=[]).values('tags')
-        # 整合到列表里
-        tag_count_list: list[int] = []
-        for article in articles:
-            tag_count_list += article['tags']
-        # 计算每个标签用到的次数
-        counter: Counter = Counter(tag_count_list)
+    def get_category_archive(self) -> list[dict]:
+        counts: dict[str, int] = archive_store.get_counts('category')
+        # 把分类id替换成分类名，id为0表示未分类
+        names: dict[str, str] = request_scope.get('category_names', self.get_category_names)
+        archive: list[dict] = []
+        for category_id, count in sorted(counts.items(), key=lambda item: int(item[0])):
+            if category_id in names:
+                archive.append({'text': names[category_id], 'count': count})
+        return archive
+
+    def get_tag_archive(self) -> list[list]:
+        counts: dict[str, int] = archive_store.get_counts('tag')
         # 把标签id替换成标签名
-        tags: QuerySet = Tag.objects.all()
-        tags_dict: dict[int, str] = {tag.id: tag.name for tag in tags}
         # [["测试标签", 3], ["分类", 1], ["编程", 1], ["随笔", 2]]
         tag_set_list: list[list[str, int]] = []
-        for tag_id, tag_count in counter.items():
-            tag_set_list.append([tags_dict[tag_id], tag_count])
-        return self.success(tag_set_list)
+        names: dict[int, str] = request_scope.get('tag_names', tag_registry.get_map)
+        for tag_id in sorted(int(tag_id) for tag_id in counts):
+            tag_name: Optional[str] = names.get(tag_id) or tag_registry.get_name(tag_id)
+            if tag_name is not None:
+                tag_set_list.append([tag_name, counts[str(tag_id)]])
+        return tag_set_list
 
-    def get_month_archive(self):
-        archive: QuerySet[dict] = (
-            (Article.objects
-             .annotate(month=TruncMonth('create_time'))
-             .values('month')
-             .annotate(count=Count('month'))
-             .order_by('-month'))
-        )
-        for record in archive:
-            month: datetime = record['month']
-            text: str = '{0}年{1}月'.format(month.year, month.month)
-            record['text'] = text
-            del record['month']
-        return self.success(list(archive))
+    def get_category_names(self) -> dict[str, str]:
+        """分类id => 分类名，分类数量很少，直接加载全部"""
+        categories: QuerySet[tuple] = Category.objects.values_list('id', 'name')
+        names: dict[str, str] = {str(category_id): name for category_id, name in categories}
+        names['0'] = '未分类'
+        return names
+
+    def get_month_archive(self) -> list[dict]:
+        counts: dict[str, int] = archive_store.get_counts('month')
+        archive: list[dict] = []
+        # 'YYYY-MM'按字符串倒序即按月份倒序
+        for month, count in sorted(counts.items(), reverse=True):
+            year, month_number = month.split('-')
+            text: str = '{0}年{1}月'.format(year, int(month_number))
+            archive.append({'count': count, 'text': text})
+        return archive
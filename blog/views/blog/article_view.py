@@ -1,39 +1,71 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta
+from itertools import islice
 from typing import TYPE_CHECKING, Optional
 
-from django.db.models.functions import TruncMonth
-from markdown2 import Markdown
-
 from django.db.models import F, Q
 from django.db import models
-from django.utils.html import strip_tags
 
-from blog import redis
+from blog.archive import archive_store
+from blog.cache import response_cache, tag_registry
+from blog.views.base_view import AsyncBaseView
+from blog.models import Article, ArticleTag, Category, Tag
+from blog.render import markdown_renderer
+from blog.search import search_index
 from blog.services import RedisKey
-from blog.views.base_view import BaseView
-from blog.models import Article, Category, Tag
+from blog.tracking import hot_ranking, visit_counter
 
 if TYPE_CHECKING:
+    from typing import Iterator
     from django.http import HttpRequest, QueryDict
     from django.db.models import QuerySet
 
 
-class ArticleView(BaseView):
+class ArticleView(AsyncBaseView):
     view_name = '文章'
+    # 包含新标签入库、归档统计重建、访问数恢复等缓存未命中时的查询
+    query_budgets = {'get': 3, 'post': 10, 'put': 12, 'delete': 8}
+    # _ref只决定是否计数，访问数在读取缓存后合并，不参与缓存key
+    cache_params = ('id', 'html')
 
-    def get(self, request: HttpRequest):
+    async def get(self, request: HttpRequest):
         # 参数获取与校验
         params: QueryDict = request.GET
         article_id: int = params.get("id")
         self.required(id=article_id)
-        # 获取文章
-        article: Article = Article.objects.get(pk=article_id)
+        # 文章内容走响应缓存，同一篇文章的并发请求只有一个查库，查库放到线程中执行
+        data_json: str = await response_cache.aget_or_set(
+            request, lambda: self.run_sync(self.get_article_data, article_id, params), self.cache_ttl, self.cache_params
+        )
+        data: dict = json.loads(data_json)
+        # 如果前台访问，访问数加1，并返回访问统计数据，只访问redis，不占用ORM线程
+        if params.get('_ref', '') == 'front':
+            data.update(await self.run_sync(
+                self.count_visit, article_id, self.get_visitor(request), thread_sensitive=False
+            ))
+        return self.success(data)
+
+    def get_visitor(self, request: HttpRequest) -> str:
+        """访客标识，用ip和User-Agent区分访客，只用于估算独立访客数，不保存原始ip"""
+        forwarded_for: str = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        ip: str = forwarded_for.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+        user_agent: str = request.META.get('HTTP_USER_AGENT', '')
+        return hashlib.md5('{0}|{1}'.format(ip, user_agent).encode('utf-8')).hexdigest()[:16]
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 前台阅读时要计数并返回实时访问数，每次响应都不同，不支持条件请求
+        if request.GET.get('_ref', '') == 'front':
+            return None
+        return RedisKey.BLOG_CACHE_VERSION
+
+    def get_article_data(self, article_id: int, params: QueryDict) -> dict:
+        # 获取文章，分类一起join查出
+        article: Article = Article.objects.select_related('category').get(pk=article_id)
         # 获取对应标签名称
-        tags: list[dict] = Tag.objects.filter(id__in=article.tags).values('name')
-        tag_names: list[str] = [tag['name'] for tag in tags]
+        tag_names: list[str] = tag_registry.get_names(article.tags)
 
         # 处理没有分类的情况
         category: Optional[Category] = article.category
@@ -47,12 +79,18 @@ class ArticleView(BaseView):
             'category_name': category_name,
             'tags': tag_names
         }
-        # 如果前台访问，访问数加1，并返回访问统计数据
-        ref = params.get('_ref', '')
-        if ref == 'front':
-            visit = redis.hincrby(RedisKey.BLOG_ARTICLE_VISIT, article_id)
-            data['visit'] = visit
-        return self.success(data)
+        # 需要时返回渲染好的html和目录，前端不用再渲染一遍
+        if params.get('html') == 'true':
+            rendered: dict[str, str] = markdown_renderer.render(article.body)
+            data['html'] = rendered['html']
+            data['toc'] = rendered['toc']
+        return data
+
+    def count_visit(self, article_id: int, visitor: str) -> dict:
+        return {
+            'visit': visit_counter.incr(article_id, visitor),
+            'unique_visit': hot_ranking.get_unique_counts([article_id])[0],
+        }
 
     def post(self, request: HttpRequest):
         # 获取参数并校验
@@ -79,6 +117,10 @@ class ArticleView(BaseView):
         article: Article = Article.objects.create(
             title=title, body=body, excerpt=excerpt, category=category, tags=ids_of_tags
         )
+        self.save_tag_relations(article)
+        archive_store.add_article(article)
+        search_index.index(article)
+        response_cache.bump()
         # 返回新建文章id给前端，让用户可以继续编辑
         return self.success({'id': article.id}, '文章创建成功')
 
@@ -102,12 +144,19 @@ class ArticleView(BaseView):
         excerpt: str = self.md_body_to_excerpt(body)
         # 获取文章并修改
         article: Article = Article.objects.get(pk=article_id)
+        # 记录修改前的分类和标签，用于更新归档统计
+        old_category_id: Optional[int] = article.category_id
+        old_tags: list[int] = article.tags
         article.title = title
         article.body = body
         article.excerpt = excerpt
         article.category = category
         article.tags = ids_of_tags
         article.save()
+        self.save_tag_relations(article, old_tags)
+        archive_store.update_article(old_category_id, old_tags, article)
+        search_index.index(article)
+        response_cache.bump()
 
     def delete(self, request: HttpRequest):
         # 获取id并校验
@@ -117,51 +166,89 @@ class ArticleView(BaseView):
         # 如果文章存在，则删除
         article: Article = Article.objects.get(pk=article_id)
         article.delete()
-        # 清理redis访问统计
-        redis.hdel(RedisKey.BLOG_ARTICLE_VISIT, article_id)
+        archive_store.remove_article(article)
+        search_index.remove(article_id)
+        response_cache.bump()
+        # 清理访问统计
+        visit_counter.remove(article_id)
 
     def tag_names_to_ids(self, tag_names: list[str]) -> list[int]:
-        """给定标签name列表，返回id列表，如果标签name不存在，则创建，最多执行3次db"""
+        """给定标签name列表，返回id列表，如果标签name不存在，则创建"""
         if not tag_names:
             return []
+        return tag_registry.names_to_ids(tag_names)
 
-        # 查出所有标签
-        db_tags: QuerySet[dict] = Tag.objects.values('name')
-        names_of_db_tags: list[str] = [tag['name'] for tag in db_tags]
-
-        # 找出不存在的标签名称
-        tags_not_exist_in_db: list[str] = []
-        for name in tag_names:
-            if name not in names_of_db_tags:
-                tags_not_exist_in_db.append(name)
-
-        # 保存新标签
-        if tags_not_exist_in_db:
-            objs: list[Tag] = [Tag(name=name) for name in tags_not_exist_in_db]
-            Tag.objects.bulk_create(objs)
-        tags_of_article: list[dict] = Tag.objects.filter(name__in=tag_names).values('id')
-
-        # 获取标签ids
-        ids: list[int] = [tag['id'] for tag in tags_of_article]
-        return ids
+    def save_tag_relations(self, article: Article, old_tags: Optional[list[int]] = None) -> None:
+        """按Article.tags同步文章标签关联表，只增删有变化的部分"""
+        new_tags_set: set[int] = set(article.tags)
+        old_tags_set: set[int] = set(old_tags or [])
+        tags_need_add: set[int] = new_tags_set - old_tags_set
+        tags_need_delete: set[int] = old_tags_set - new_tags_set
+        if tags_need_add:
+            objs: list[ArticleTag] = [ArticleTag(article=article, tag_id=tag_id) for tag_id in tags_need_add]
+            ArticleTag.objects.bulk_create(objs, ignore_conflicts=True)
+        if tags_need_delete:
+            ArticleTag.objects.filter(article=article, tag__in=tags_need_delete).delete()
 
     def md_body_to_excerpt(self, md_body: str, length: int = 180) -> str:
-        """md源文本转成html后去除标签，再去掉换行，生成摘要"""
-        md: Markdown = Markdown()
-        body_with_html_tag: str = md.convert(md_body)
-        excerpt: str = strip_tags(body_with_html_tag)
-        excerpt = excerpt.replace('\n', ' ')
-        return excerpt[:length]
+        """md源文本转成html后去除标签，再去掉换行，生成摘要，相同正文直接取缓存"""
+        return markdown_renderer.render(md_body)['excerpt'][:length]
 
 
-class ArticlesView(BaseView):
+class ArticlesView(AsyncBaseView):
     view_name = '文章列表'
+    query_budgets = {'get': 3}
+    read_replica = True
+    cache_params = ('fields', 'filters', 'pagination')
 
-    def get(self, request: HttpRequest):
+    # 列表可返回的字段，visit不在db中，单独处理
+    list_fields: list[str] = ['id', 'title', 'excerpt', 'category_name', 'tags', 'create_time', 'update_time', 'visit']
+    # 只有在fields中指定时才返回的字段
+    optional_fields: list[str] = ['unique_visit']
+    # 实时变化的字段，不在db和响应缓存中，读取后再合并
+    live_fields: tuple[str, ...] = ('visit', 'unique_visit')
+
+    async def get(self, request: HttpRequest):
         """
         查询文章列表
+        不传pagination返回全部文章，兼容旧版前端
+        传pagination时使用游标分页，pagination => {"cursor": "上一页返回的next_cursor", "page_size": 20}
+        fields => ["id", "title"] 只返回指定字段，id和update_time总会返回，unique_visit（独立访客数）需要指定才返回
         """
         params: QueryDict = request.GET
+        fields: list[str] = self.get_fields(params.get('fields', ''))
+        # 后台列表不走缓存，不分页时返回全部文章，逐行流式输出
+        if not response_cache.is_cacheable(request) and not params.get('pagination', ''):
+            articles: QuerySet[dict] = await self.run_sync(self.get_articles_queryset, params, fields)
+            return self.success_stream(self.iter_articles(articles, fields), {})
+        # 文章列表走响应缓存，访问数实时变化，不进缓存，读取后再合并
+        data_json: str = await response_cache.aget_or_set(
+            request, lambda: self.run_sync(self.get_articles, params, fields), self.cache_ttl, self.cache_params
+        )
+        data: dict = json.loads(data_json)
+        # 写入文章访问数统计，只访问redis，不占用ORM线程
+        if any(field in fields for field in self.live_fields):
+            await self.run_sync(self.handle_visit_count, data['lists'], fields, thread_sensitive=False)
+        return self.success(data)
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 访问数实时变化，返回visit、unique_visit字段时不支持条件请求
+        if any(field in self.get_fields(request.GET.get('fields', '')) for field in self.live_fields):
+            return None
+        return RedisKey.BLOG_CACHE_VERSION
+
+    def get_fields(self, fields_str: str) -> list[str]:
+        """解析fields参数，忽略不支持的字段，不传时返回全部字段"""
+        if not fields_str:
+            return self.list_fields
+        fields: list[str] = json.loads(fields_str)
+        # 游标分页需要id和update_time
+        return ['id', 'update_time'] + [
+            field for field in self.list_fields + self.optional_fields
+            if field in fields and field not in ('id', 'update_time')
+        ]
+
+    def get_articles_queryset(self, params: QueryDict, fields: list[str]) -> QuerySet[dict]:
         # 获取全部文章
         articles: QuerySet[Article] = Article.objects
 
@@ -169,31 +256,43 @@ class ArticlesView(BaseView):
         filters_str: str = params.get('filters', '')
         filters: dict = json.loads(filters_str) if filters_str else {}
         articles = self.handle_filters(articles, filters)
-        # 排序
-        articles = articles.order_by('-update_time')
-        articles: QuerySet[dict] = articles.annotate(category_name=F('category__name')).values(
-            'id', 'title', 'excerpt', 'category_name', 'tags', 'create_time', 'update_time'
-        )
+        # 排序，update_time相同时按id排序，保证游标分页顺序稳定
+        articles = articles.order_by('-update_time', '-id')
+        if 'category_name' in fields:
+            articles = articles.annotate(category_name=F('category__name'))
+        db_fields: list[str] = [field for field in fields if field not in self.live_fields]
+        return articles.values(*db_fields)
 
-        # 处理分页 05-22 去掉后端分页 提高体验
-        # pagination_str: str = params.get('pagination', '')
-        # records, [total, current, page_size] = self.handle_pagination(articles, pagination_str)
-
-        # 格式化日期
-        self.format_datetime_to_str(articles, 'create_time', 'update_time')
-        # 处理未分类
-        for record in articles:
-            if record['category_name'] is None:
-                record['category_name'] = '未分类'
-
-        # 写入文章访问数统计
-        self.handle_visit_count(articles)
-        return self.success({
-            # 'total': total,
-            # 'current': current,
-            # 'page_size': page_size,
-            'lists': list(articles)
-        })
+    def get_articles(self, params: QueryDict, fields: list[str]) -> dict:
+        articles: QuerySet[dict] = self.get_articles_queryset(params, fields)
+
+        # 处理分页 05-22 去掉后端分页 提高体验，按需使用游标分页
+        data: dict = {}
+        pagination_str: str = params.get('pagination', '')
+        if pagination_str:
+            articles, next_cursor = self.handle_pagination(articles, pagination_str)
+            data['next_cursor'] = next_cursor
+
+        # 日期字段由序列化器直接格式化，这里只处理未分类
+        if 'category_name' in fields:
+            for record in articles:
+                if record['category_name'] is None:
+                    record['category_name'] = '未分类'
+
+        data['lists'] = list(articles)
+        return data
+
+    def iter_articles(self, articles: QuerySet[dict], fields: list[str], batch_size: int = 200) -> Iterator[dict]:
+        """逐批从db读取文章，处理未分类和访问数后逐行返回，不在内存中保留整个列表"""
+        rows: Iterator[dict] = articles.iterator(chunk_size=batch_size)
+        while batch := list(islice(rows, batch_size)):
+            if 'category_name' in fields:
+                for record in batch:
+                    if record['category_name'] is None:
+                        record['category_name'] = '未分类'
+            if any(field in fields for field in self.live_fields):
+                self.handle_visit_count(batch, fields)
+            yield from batch
 
     def handle_filters(self, records: QuerySet[Article], filters: dict) -> QuerySet[Article]:
         # 后台分类id筛选
@@ -213,14 +312,9 @@ class ArticlesView(BaseView):
         # 后台标签id筛选
         tag_id_filter: list = filters.get('tag_ids', [])
         if tag_id_filter:
-            # 所有条件执行OR操作
-            conditions: list = []
-            for tag_id in tag_id_filter:
-                conditions.append(Q(tags__contains=tag_id))
-            condition: Q = conditions[0]
-            for item in conditions[1:]:
-                condition |= item
-            records = records.filter(condition)
+            # 包含任意一个标签即可，走关联表的标签索引
+            article_ids: QuerySet = ArticleTag.objects.filter(tag__in=tag_id_filter).values('article')
+            records = records.filter(id__in=article_ids)
         # 前台分类name筛选
         category_name_filter: str = filters.get('category_name', '')
         if category_name_filter:
@@ -231,33 +325,39 @@ class ArticlesView(BaseView):
         # 前台标签name筛选
         tag_name_filter: str = filters.get('tag_name', '')
         if tag_name_filter:
-            tag: Tag = Tag.objects.get(name=tag_name_filter)
-            records = records.filter(tags__contains=tag.id)
+            tag_id: Optional[int] = tag_registry.get_id(tag_name_filter)
+            if tag_id is None:
+                raise Tag.DoesNotExist
+            records = records.filter(id__in=ArticleTag.objects.filter(tag=tag_id).values('article'))
         # 前台月份筛选
         month_filter: str = filters.get('month', '')
         if month_filter:
             if len(month_filter) not in [6, 7]:
-                return self.success([])
-            month: datetime = datetime.strptime(month_filter, '%Y-%m')
-            records = records.annotate(month=TruncMonth('create_time')).filter(month=month)
+                # 月份格式不对时没有匹配的文章，调用方还要排序分页，返回空的查询集
+                return records.none()
+            # 半开区间 [本月1日, 下月1日)，直接比较create_time，可以走索引
+            start: datetime = datetime.strptime(month_filter, '%Y-%m')
+            end: datetime = (start + timedelta(days=32)).replace(day=1)
+            records = records.filter(create_time__gte=start, create_time__lt=end)
 
         return records
 
-    def handle_visit_count(self, records: QuerySet[dict]):
+    def handle_visit_count(self, records: list[dict], fields: list[str]):
         """
         处理文章访问数统计，使用引用传递，结果直接写入到record中
         Args:
-            records: orm查询结果
+            records: 文章列表数据
+            fields: 返回的字段，包含visit和unique_visit时分别写入
         """
         records_ids: list = []
         for record in records:
             records_ids.append(record['id'])
-        if records_ids:
-            # 从redis取文章访问统计
-            visit_counts = redis.hmget(RedisKey.BLOG_ARTICLE_VISIT, records_ids)
+        if records_ids and 'visit' in fields:
+            # 依次从进程内缓存、redis、db取文章访问统计
+            visit_counts: list[int] = visit_counter.get_counts(records_ids)
             for index, count in enumerate(visit_counts):
-                if count is None:
-                    count = 0
-                else:
-                    count = int(count)
                 records[index]['visit'] = count
+        if records_ids and 'unique_visit' in fields:
+            unique_counts: list[int] = hot_ranking.get_unique_counts(records_ids)
+            for index, count in enumerate(unique_counts):
+                records[index]['unique_visit'] = count
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import copy
+import json
+import asyncio
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.http import QueryDict
+from django.urls import resolve
+
+from blog.cache import request_scope
+from blog.views.base_view import AsyncBaseView
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest, HttpResponse
+
+
+class BundleView(AsyncBaseView):
+    """前台组合接口，一次请求在进程内执行多个前台读接口，合并成一个json返回
+
+    requests => [{"key": "articles", "path": "articles", "params": {"limit": 10}}, ...]
+    不传时返回首页需要的文章列表、三种归档、标签映射和说说。
+    子请求直接调用对应的view，走各自的响应缓存、只读库和查询预算，
+    同一次组合请求中的子请求共用一份标签映射和分类映射。
+    """
+    view_name = '组合'
+    # 只统计组合接口自己的查询，子请求的查询预算由各自的view检查
+    query_budgets = {'get': 0}
+    # 可以组合的前台读接口
+    allowed_paths: tuple[str, ...] = ('article', 'articles', 'archive', 'tagMap', 'records', 'moods', 'search', 'hot')
+    # 单次组合的最大子请求数
+    max_requests: int = 10
+    default_requests: list[dict] = [
+        {'key': 'articles', 'path': 'articles'},
+        {'key': 'categoryArchive', 'path': 'archive', 'params': {'cate': 'category'}},
+        {'key': 'tagArchive', 'path': 'archive', 'params': {'cate': 'tag'}},
+        {'key': 'monthArchive', 'path': 'archive', 'params': {'cate': 'month'}},
+        {'key': 'tagMap', 'path': 'tagMap'},
+        {'key': 'moods', 'path': 'moods'},
+    ]
+
+    async def get(self, request: HttpRequest):
+        requests_str: str = request.GET.get('requests', '')
+        sub_requests: list[dict] = self.parse_requests(requests_str) if requests_str else self.default_requests
+        with request_scope.open():
+            responses: list[HttpResponse] = await asyncio.gather(*[
+                self.call_sub_request(request, sub_request['path'], sub_request.get('params', {}))
+                for sub_request in sub_requests
+            ])
+        # 子响应已经是序列化好的json，直接拼接，保留各自的ret和msg
+        data_json: str = '{{{0}}}'.format(', '.join(
+            '{0}: {1}'.format(json.dumps(sub_request['key']), response.content.decode(encoding='utf-8'))
+            for sub_request, response in zip(sub_requests, responses)
+        ))
+        return self.success_json(data_json)
+
+    def parse_requests(self, requests_str: str) -> list[dict]:
+        """校验子请求列表，key默认为path，key不能重复"""
+        sub_requests = json.loads(requests_str)
+        if not isinstance(sub_requests, list) or not sub_requests:
+            raise ValueError('requests必须是非空列表')
+        if len(sub_requests) > self.max_requests:
+            raise ValueError('一次最多组合{0}个请求'.format(self.max_requests))
+        keys: set[str] = set()
+        for sub_request in sub_requests:
+            if not isinstance(sub_request, dict) or sub_request.get('path') not in self.allowed_paths:
+                raise ValueError('不支持组合的请求：{0}'.format(json.dumps(sub_request, ensure_ascii=False)))
+            if not isinstance(sub_request.get('params', {}), dict):
+                raise ValueError('params必须是对象')
+            sub_request['key'] = str(sub_request.get('key') or sub_request['path'])
+            if sub_request['key'] in keys:
+                raise ValueError('重复的key：{0}'.format(sub_request['key']))
+            keys.add(sub_request['key'])
+        return sub_requests
+
+    async def call_sub_request(self, request: HttpRequest, path: str, params: dict) -> HttpResponse:
+        sub_request: HttpRequest = self.make_sub_request(request, path, params)
+        match = resolve(sub_request.path_info)
+        sub_request.resolver_match = match
+        # AsyncBaseView的view是协程函数，其余view放到线程中执行；子请求的sql由子请求的view自己统计，不用run_sync
+        if asyncio.iscoroutinefunction(match.func):
+            return await match.func(sub_request, *match.args, **match.kwargs)
+        return await sync_to_async(match.func)(sub_request, *match.args, **match.kwargs)
+
+    def make_sub_request(self, request: HttpRequest, path: str, params: dict) -> HttpRequest:
+        """复制组合请求，替换路径和查询参数，请求头等保持不变"""
+        # 非字符串的参数按json传，e.g. filters
+        query_string: str = urlencode({
+            name: value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            for name, value in params.items()
+        })
+        sub_request: HttpRequest = copy.copy(request)
+        sub_request.path = request.path.rsplit('/', 1)[0] + '/' + path
+        sub_request.path_info = request.path_info.rsplit('/', 1)[0] + '/' + path
+        sub_request.META = dict(request.META, PATH_INFO=sub_request.path_info, QUERY_STRING=query_string)
+        sub_request.GET = QueryDict(query_string)
+        sub_request.bundled = True
+        return sub_request
@@ -3,6 +3,8 @@ from __future__ import annotations
 import json
 from typing import TYPE_CHECKING
 
+from blog.archive import archive_store
+from blog.cache import response_cache
 from blog.models import Category
 from blog.views.base_view import BaseView
 
@@ -12,6 +14,7 @@ if TYPE_CHECKING:
 
 class CategoryView(BaseView):
     view_name = '分类'
+    query_budgets = {'get': 1, 'post': 2, 'put': 3, 'delete': 6}
 
     def get(self, request: HttpRequest):
         params: QueryDict = request.GET
@@ -28,6 +31,7 @@ class CategoryView(BaseView):
         if is_category_exist:
             return self.fail(10022, '分类名重复')
         Category.objects.create(name=name)
+        response_cache.bump()
 
     def put(self, request: HttpRequest):
         params: dict = json.loads(request.body)
@@ -41,17 +45,24 @@ class CategoryView(BaseView):
             return self.fail(10022, '分类名重复')
         category.name = name
         category.save()
+        response_cache.bump()
 
     def delete(self, request: HttpRequest):
         params: dict = json.loads(request.body)
         category_id: int = params.get('id')
         self.required(id=category_id)
         category: Category = Category.objects.get(pk=category_id)
+        # delete()之后category.id为None，先记下来
+        deleted_id: int = category.id
         category.delete()
+        # 分类下的文章变为未分类
+        archive_store.move_category(deleted_id)
+        response_cache.bump()
 
 
 class CategoriesView(BaseView):
     view_name = '分类列表'
+    query_budgets = {'get': 1}
 
     def get(self, request: HttpRequest):
         params: QueryDict = request.GET
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from blog.cache import response_cache
+from blog.models import Article
+from blog.tracking import hot_ranking
+from blog.views.base_view import BaseView
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest, QueryDict
+
+
+class HotView(BaseView):
+    view_name = '热门文章'
+    # 排行未就绪时会从db重建
+    query_budgets = {'get': 2}
+    read_replica = True
+    # 排行随访问实时变化，短时间缓存，失效时只有一个进程重新查询
+    cache_ttl = 10
+    cache_params = ('days', 'limit')
+    # 最大条数
+    max_limit: int = 50
+
+    def get(self, request: HttpRequest):
+        """
+        热门文章排行
+        days => 0 总排行 | 7 最近7天 | 30 最近30天
+        """
+        params: QueryDict = request.GET
+        days: int = int(params.get('days', 0))
+        limit: int = min(max(int(params.get('limit', 10)), 1), self.max_limit)
+        data_json: str = response_cache.get_or_set(
+            request, lambda: self.get_hot(days, limit), self.cache_ttl, self.cache_params
+        )
+        return self.success_json(data_json)
+
+    def get_hot(self, days: int, limit: int) -> list[dict]:
+        ranking: list[tuple[int, int]] = hot_ranking.get_top(days, limit)
+        article_ids: list[int] = [article_id for article_id, _ in ranking]
+        titles: dict[int, str] = dict(Article.objects.filter(id__in=article_ids).values_list('id', 'title'))
+        unique_counts: list[int] = hot_ranking.get_unique_counts(article_ids)
+        records: list[dict] = [
+            {'id': article_id, 'title': titles[article_id], 'visit': visit, 'unique_visit': unique_visit}
+            for (article_id, visit), unique_visit in zip(ranking, unique_counts)
+            # 排行中可能还有刚删除的文章
+            if article_id in titles
+        ]
+        return records
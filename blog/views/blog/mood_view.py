@@ -5,10 +5,13 @@ from typing import TYPE_CHECKING
 
 from django.db.models import ObjectDoesNotExist
 
+from blog.cache import response_cache
 from blog.models import Mood
-from blog.views.base_view import BaseView
+from blog.services import RedisKey
+from blog.views.base_view import BaseView, AsyncBaseView
 
 if TYPE_CHECKING:
+    from typing import Optional
     from django.http import HttpRequest
     from django.http import QueryDict
     from django.db.models import QuerySet
@@ -16,6 +19,7 @@ if TYPE_CHECKING:
 
 class MoodView(BaseView):
     view_name = '说说'
+    query_budgets = {'get': 1, 'post': 1, 'put': 2, 'delete': 2}
 
     def get(self, request: HttpRequest):
         params: QueryDict = request.GET
@@ -32,6 +36,7 @@ class MoodView(BaseView):
         if len(content) > 120:
             return self.fail(10023, '不能超过120个字')
         Mood.objects.create(content=content)
+        response_cache.bump()
 
     def put(self, request: HttpRequest):
         params: dict = json.loads(request.body)
@@ -43,6 +48,7 @@ class MoodView(BaseView):
         mood: Mood = Mood.objects.get(id=mood_id)
         mood.content = content
         mood.save()
+        response_cache.bump()
 
     def delete(self, request: HttpRequest):
         params: dict = json.loads(request.body)
@@ -51,18 +57,37 @@ class MoodView(BaseView):
         mood: Mood = Mood.objects.get(id=mood_id)
         mood.is_deleted = True
         mood.save()
+        response_cache.bump()
 
 
-class MoodsView(BaseView):
+class MoodsView(AsyncBaseView):
     view_name = '说说列表'
+    query_budgets = {'get': 1}
+    read_replica = True
+    cache_params = ()
 
     # TODO:加入ref公参后需要给前台的返回结果中去掉私密的说说
-    def get(self, request: HttpRequest):
-        moods: QuerySet[dict] = (
+    async def get(self, request: HttpRequest):
+        # 后台列表不走缓存，逐行流式输出
+        if not response_cache.is_cacheable(request):
+            return self.success_stream(self.get_moods_queryset().iterator())
+        data_json: str = await response_cache.aget_or_set(
+            request, lambda: self.run_sync(self.get_moods), self.cache_ttl, self.cache_params
+        )
+        return self.success_json(data_json)
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 说说增删改都会递增内容版本号
+        return RedisKey.BLOG_CACHE_VERSION
+
+    def get_moods(self) -> list[dict]:
+        return list(self.get_moods_queryset())
+
+    def get_moods_queryset(self) -> QuerySet[dict]:
+        # create_time由序列化器直接格式化
+        return (
             Mood.objects
                 .filter(is_deleted=False)
                 .order_by('-create_time')
                 .values('id', 'content', 'create_time', 'is_visible')
         )
-        self.format_datetime_to_str(moods, 'create_time')
-        return self.success(list(moods))
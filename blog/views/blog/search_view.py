@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from blog.search import search_index
+from blog.services import RedisKey
+from blog.views.base_view import BaseView
+
+if TYPE_CHECKING:
+    from typing import Optional
+    from django.http import HttpRequest, QueryDict
+
+
+class SearchView(BaseView):
+    view_name = '搜索'
+    # 索引未就绪时会从db重建
+    query_budgets = {'get': 3}
+    # 每页最大条数
+    max_limit: int = 50
+
+    def get(self, request: HttpRequest):
+        params: QueryDict = request.GET
+        query: str = params.get('q', '').strip()
+        self.required(q=query)
+        offset: int = max(int(params.get('offset', 0)), 0)
+        limit: int = min(max(int(params.get('limit', 10)), 1), self.max_limit)
+        total, records = search_index.search(query, offset, limit)
+        return self.success({'total': total, 'lists': records})
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 索引随文章增删改更新，同时递增内容版本号
+        return RedisKey.BLOG_CACHE_VERSION
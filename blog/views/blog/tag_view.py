@@ -2,18 +2,30 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from blog.models import Tag
+from blog.cache import request_scope, response_cache, tag_registry
+from blog.services import RedisKey
 from blog.views.base_view import BaseView
 
 if TYPE_CHECKING:
+    from typing import Optional
     from django.http import HttpRequest
-    from django.db.models import QuerySet
 
 
 class TagMapView(BaseView):
     view_name = '标签'
+    query_budgets = {'get': 1}
+    read_replica = True
+    cache_params = ()
 
     def get(self, request: HttpRequest):
-        tags: QuerySet[Tag] = Tag.objects.all()
-        tags_dict: dict[int, str] = {tag.id: tag.name for tag in tags}
-        return self.success(tags_dict)
+        return self.success_json(
+            response_cache.get_or_set(request, self.get_tags_dict, self.cache_ttl, self.cache_params)
+        )
+
+    def get_etag_key(self, request: HttpRequest) -> Optional[str]:
+        # 标签只会新增，新增时递增标签版本号
+        return RedisKey.BLOG_TAG_VERSION
+
+    def get_tags_dict(self) -> dict[int, str]:
+        # 组合接口中和标签归档共用同一份映射
+        return request_scope.get('tag_names', tag_registry.get_map)
@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 from typing import TYPE_CHECKING
 
+from blog.cache import permission_cache
 from blog.models import User, Permission
 from blog.models import Group
 from blog.views.base_view import BaseView
@@ -14,6 +15,7 @@ if TYPE_CHECKING:
 
 class GroupView(BaseView):
     view_name = '权限组'
+    query_budgets = {'post': 2, 'put': 3, 'delete': 6}
 
     def post(self, request: HttpRequest):
         params: dict = json.loads(request.body)
@@ -41,11 +43,14 @@ class GroupView(BaseView):
         group_id: int = params.get('id')
         self.required(id=group_id)
         group: Group = Group.objects.get(id=group_id)
+        member_ids: list[int] = list(group.user_set.values_list('id', flat=True))
         group.delete()
+        permission_cache.invalidate(*member_ids)
 
 
 class GroupsView(BaseView):
     view_name = '权限组列表'
+    query_budgets = {'get': 1}
 
     def get(self, request: HttpRequest):
         records: QuerySet[dict] = Group.objects.values('id', 'name')
@@ -54,6 +59,7 @@ class GroupsView(BaseView):
 
 class GroupMembersView(BaseView):
     view_name = '权限组成员'
+    query_budgets = {'get': 2, 'put': 5}
 
     def get(self, request: HttpRequest):
         params: QueryDict = request.GET
@@ -71,9 +77,8 @@ class GroupMembersView(BaseView):
         self.required(group_id=group_id)
 
         group: Group = Group.objects.get(id=group_id)
-        # 获取当前权限组所有成员
-        members: QuerySet[User] = group.user_set.all()
-        member_ids: list[int] = [member.id for member in members]
+        # 获取当前权限组所有成员id，不需要加载完整的用户
+        member_ids: list[int] = list(group.user_set.values_list('id', flat=True))
         # 对比所有成员和前端传的old members的差集，移除成员
         members_remove: set[int] = set(member_ids) - set(old_members)
         if members_remove:
@@ -81,10 +86,13 @@ class GroupMembersView(BaseView):
         # 新增new members
         if new_members:
             group.user_set.add(*new_members)
+        # 移除和新增的成员权限都发生了变化
+        permission_cache.invalidate(*members_remove, *(new_members or []))
 
 
 class GroupPermissionView(BaseView):
     view_name = '权限'
+    query_budgets = {'get': 1, 'put': 6}
 
     def get(self, request: HttpRequest):
         params: QueryDict = request.GET
@@ -124,3 +132,7 @@ class GroupPermissionView(BaseView):
         if keys_need_delete:
             objs: QuerySet = Permission.objects.filter(name__in=keys_need_delete, group=group)
             objs.delete()
+        # 清理组内所有成员的权限缓存
+        if keys_need_add or keys_need_delete:
+            member_ids: list[int] = list(group.user_set.values_list('id', flat=True))
+            permission_cache.invalidate(*member_ids)
@@ -3,36 +3,43 @@ from __future__ import annotations
 import copy
 from typing import TYPE_CHECKING
 
-from blog import authority_config
-from blog.models import User
+from blog.static_config import authority_config
+from blog.cache import menu_cache, permission_cache
 from blog.views.base_view import BaseView
 
 if TYPE_CHECKING:
     from django.http import HttpRequest
+    from blog.static_config import ConfigSnapshot
 
 
 class MenuView(BaseView):
     view_name = '菜单'
+    query_budgets = {'get': 2}
 
     def get(self, request: HttpRequest):
-        # 获取用户信息
+        # 获取用户状态和所有权限key，走权限缓存，用户不存在时抛出ObjectDoesNotExist
         user_id: int = self.payload.get('id')
-        user: User = User.objects.get(id=user_id)
-        is_admin: bool = user.is_admin
-
-        # 获取用户所有权限key
-        keys: list[str] = self.get_keys_of_user(user)
+        permission: dict = permission_cache.get(user_id)
+        is_admin: bool = permission['is_admin']
+        keys: list[str] = permission['keys']
         # 不是管理员且没有权限直接返回空
         if not (is_admin or keys):
             return self.success([])
 
-        # 拷贝一份menu dict用来做删减
-        menu: list[dict] = copy.deepcopy(authority_config)
-        self.adjust_menu(menu, keys, is_admin)
+        # 同一版本权限配置下，相同权限key集合的菜单只生成一次
+        config: ConfigSnapshot = authority_config.snapshot
+        menu_json: str = menu_cache.get_or_set(
+            keys, is_admin, config.version, lambda: self.build_menu(config.data, keys, is_admin)
+        )
+        return self.success_json(menu_json)
 
-        return self.success(menu)
+    def build_menu(self, authority: list[dict], keys: list[str], is_admin: bool) -> list[dict]:
+        # 拷贝一份menu dict用来做删减
+        menu: list[dict] = copy.deepcopy(authority)
+        self.adjust_menu(menu, set(keys), is_admin)
+        return menu
 
-    def adjust_menu(self, menu: list[dict], keys: list[str], is_admin: bool):
+    def adjust_menu(self, menu: list[dict], keys: set[str], is_admin: bool):
         """ 根据用户的操作权限key，调整侧边栏导航结构，!!keys里没包含页面权限，只有操作权限
 
         Args:
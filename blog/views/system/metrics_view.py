@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from blog.cache import permission_cache
+from blog.tracking import metrics_collector
+from blog.views.base_view import BaseView
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest
+
+
+class MetricsView(BaseView):
+    """接口性能数据，只有管理员可以访问"""
+    view_name = '性能数据'
+    query_budgets = {'get': 0, 'delete': 2}
+
+    def get(self, request: HttpRequest):
+        if response := self.verify_admin():
+            return response
+        return self.success(metrics_collector.summary())
+
+    def delete(self, request: HttpRequest):
+        """清空性能数据，重新开始统计"""
+        if response := self.verify_admin():
+            return response
+        metrics_collector.reset()
+
+    def verify_admin(self):
+        user_id: int = self.payload.get('id')
+        if not permission_cache.get(user_id)['is_admin']:
+            return self.fail(10010, '权限不足')
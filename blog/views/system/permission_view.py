@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from blog import authority_config
+from blog.static_config import authority_config
 from blog.views.base_view import BaseView
 
 if TYPE_CHECKING:
@@ -11,7 +11,8 @@ if TYPE_CHECKING:
 
 class PermissionTreeView(BaseView):
     view_name = '权限'
+    query_budgets = {'get': 0}
 
     def get(self, request: HttpRequest):
         """权限树所有数据，用于树控件数据展示"""
-        return self.success(authority_config)
+        return self.success_json(authority_config.data_json)
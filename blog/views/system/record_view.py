@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-import json
 from typing import TYPE_CHECKING
 
+from blog.static_config import records_config
 from blog.views.base_view import BaseView
 
 if TYPE_CHECKING:
@@ -11,8 +11,8 @@ if TYPE_CHECKING:
 
 class RecordsView(BaseView):
     view_name = '更新记录'
+    query_budgets = {'get': 0}
 
     def get(self, request: HttpRequest):
-        with open('blog/Records.json', 'rb') as records_file:
-            records: list[dict] = json.load(records_file)
-        return self.success(records)
+        # 更新记录常驻内存，文件修改后自动重新加载
+        return self.success_json(records_config.data_json)
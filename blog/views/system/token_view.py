@@ -14,6 +14,7 @@ if TYPE_CHECKING:
 
 class TokenView(BaseView):
     view_name = '口令'
+    query_budgets = {'post': 2}
 
     def post(self, request: HttpRequest):
         # 参数校验
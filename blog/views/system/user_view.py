@@ -3,11 +3,14 @@ from __future__ import annotations
 import json
 from typing import TYPE_CHECKING
 
+from blog.cache import permission_cache
 from blog.models import User
+from blog.tracking import last_login_buffer
 from blog.views.base_view import BaseView
 from django.db.models import ObjectDoesNotExist
 
 if TYPE_CHECKING:
+    from datetime import datetime
     from django.http import HttpRequest
     from django.http import QueryDict
     from django.db.models import QuerySet
@@ -15,6 +18,7 @@ if TYPE_CHECKING:
 
 class UserView(BaseView):
     view_name = '用户'
+    query_budgets = {'post': 2, 'put': 2, 'delete': 5}
 
     def post(self, request: HttpRequest):
         # 参数校验
@@ -45,13 +49,21 @@ class UserView(BaseView):
         self.required(id=user_id)
         user: User = User.objects.get(id=user_id)
         user.delete()
+        # 同时清理当前进程中该用户的token缓存
+        permission_cache.invalidate(user_id)
 
 
 class UsersView(BaseView):
     view_name = '用户列表'
+    query_budgets = {'get': 1}
 
     def get(self, request: HttpRequest):
         user_lists: QuerySet[dict] = User.objects.values('id', 'username', 'last_login', 'create_time', 'is_active')
+        # 合并还没写入db的登录时间
+        pending_logins: dict[int, datetime] = last_login_buffer.get_all()
+        for user in user_lists:
+            if user['id'] in pending_logins:
+                user['last_login'] = pending_logins[user['id']]
         self.format_datetime_to_str(user_lists, 'create_time', 'last_login')
         return self.success(list(user_lists))
 
@@ -59,6 +71,7 @@ class UsersView(BaseView):
 class UserValidityView(BaseView):
     """激活或冻结用户权限"""
     view_name = '权限'
+    query_budgets = {'put': 2}
 
     def put(self, request: HttpRequest):
         params: dict = json.loads(request.body)
@@ -71,6 +84,8 @@ class UserValidityView(BaseView):
             if user.is_active != active:
                 user.is_active = active
                 user.save()
+                # 同时清理当前进程中该用户的token缓存，冻结后已登录的token立即失效
+                permission_cache.invalidate(user_id)
         except ObjectDoesNotExist:
             return self.fail(10021, '用户不存在')
 
@@ -78,6 +93,7 @@ class UserValidityView(BaseView):
 class UserSearchListView(BaseView):
     """用于权限组成员下拉搜索"""
     view_name = '用户搜索列表'
+    query_budgets = {'get': 1}
 
     def get(self, request: HttpRequest):
         param: QueryDict = request.GET
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_backend.settings')
+# 只有一个事件循环，异步view使用异步redis客户端
+os.environ.setdefault('BLOG_ASGI', '1')
 
 application = get_asgi_application()
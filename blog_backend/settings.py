@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/3.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
+import os
 import json
 from pathlib import Path
 
@@ -17,7 +18,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
-with open('blog_backend/env.json') as env:
+# 环境变量BLOG_ENV_FILE可以切换配置，e.g. 压测使用 blog_backend/env.bench.json（SQLite + fakeredis）
+with open(os.environ.get('BLOG_ENV_FILE', 'blog_backend/env.json')) as env:
     ENV = json.load(env)
 
 # SECURITY WARNING: keep the secret key used in production secret!
@@ -99,6 +101,22 @@ DATABASES = {
     'default': ENV['DB_INFO']
 }
 
+# 只读库，e.g. "DB_REPLICAS": [{...}, {...}]，前台读接口的查询随机分配到可用的只读库，没有配置时全部走主库
+DATABASE_REPLICAS = []
+for index, info in enumerate(ENV.get('DB_REPLICAS', [])):
+    # 只读库的表和数据来自主从复制，测试时作为主库的镜像
+    info.setdefault('TEST', {'MIRROR': 'default'})
+    DATABASES['replica{0}'.format(index)] = info
+    DATABASE_REPLICAS.append('replica{0}'.format(index))
+DATABASE_ROUTERS = ['blog.db_router.ReplicaRouter']
+# 只读库复制延迟超过该秒数时不使用
+REPLICA_MAX_LAG = ENV.get('REPLICA_MAX_LAG', 2)
+# 写操作之后该秒数内的读都走主库，保证写后读一致，需要大于正常的复制延迟
+REPLICA_PIN_SECONDS = ENV.get('REPLICA_PIN_SECONDS', 5)
+
+# 接口超出查询预算或出现N+1时，True直接抛出异常（测试环境），False只记录warning日志（生产环境）
+QUERY_BUDGET_STRICT = ENV.get('QUERY_BUDGET_STRICT', False)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -136,6 +154,32 @@ USE_TZ = False
 
 # STATIC_URL = '/static/'
 
+# Logging
+# blog.metrics 每个请求输出一行json格式的性能数据
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'blog': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -1,3 +1,9 @@
 git pull
+# 先正常停止，worker退出时会写入缓冲中的访问数，等待超时再强制结束
+pkill -INT uwsgi
+for i in $(seq 1 10); do
+    pgrep uwsgi > /dev/null || break
+    sleep 1
+done
 pkill -9 uwsgi
 uwsgi --wsgi-file blog_backend/wsgi.py -d --ini blog_backend/uwsgi.ini
\ No newline at end of file